@@ -4,14 +4,22 @@
 # import frappe
 from frappe.model.document import Document
 
+from dt_fms.public.py.activity_assignment_monitor import clear_rule_condition_fields
+
 
 class ActivityAssignmentRule(Document):
-	pass
+	def on_update(self):
+		# The rule's doctype, conditions or status may have changed
+		clear_rule_condition_fields()
+
+	def on_trash(self):
+		clear_rule_condition_fields()
 
 
 import frappe
 from frappe import _
 
+
 @frappe.whitelist()
 def get_fms_active_doctypes():
     try:
@@ -23,7 +23,7 @@ function add_close_button(frm) {
 
 function handle_close_action(frm) {
 	frappe.call({
-		method: "dt_fms.dt_fms.doctype.deligation_sheet.deligation_sheet.close_deligation_sheet",
+		method: "dt_fms.dt_fms.doctype.delegation_sheet.delegation_sheet.close_delegation_sheet",
 		args: {
 			docname: frm.doc.name
 		},
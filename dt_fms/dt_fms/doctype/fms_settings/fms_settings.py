@@ -4,14 +4,20 @@
 import frappe
 from frappe.model.document import Document
 
+from dt_fms.public.py.utils import refresh_fms_settings
+
+
 class FMSSettings(Document):
     def before_save(self):
         self.custom_fields_creation()
 
+    def on_update(self):
+        refresh_fms_settings(self)
+
     def custom_fields_creation(self):
         # Get all doctypes marked active in child table
         active_doctypes = [getattr(d, 'doctype_', None) for d in self.doctypes_to_apply_on if getattr(d, 'active', 0)]
-        
+
         # Fetch all doctypes which ever had these custom fields created
         all_custom_fields = frappe.db.get_all(
             "Custom Field",
@@ -89,10 +95,9 @@ class FMSSettings(Document):
         # Now remove custom fields from inactive/removed doctypes
         for cf in all_custom_fields:
             dt = cf["dt"]
-            fieldname = cf["fieldname"]
 
             # If this doctype is not currently active, remove its custom fields
             if dt not in processed_doctypes:
                 frappe.delete_doc("Custom Field", cf["name"], ignore_permissions=True)
-                # frappe.msgprint(f"Removed Custom Field '{fieldname}' from Doctype '{dt}' as it's no longer active.")
+                # frappe.msgprint(f"Removed Custom Field '{cf["fieldname"]}' from Doctype '{dt}' as it's no longer active.")
 
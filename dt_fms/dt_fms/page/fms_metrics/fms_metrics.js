@@ -0,0 +1,74 @@
+// Copyright (c) 2025, DT and contributors
+// For license information, please see license.txt
+
+frappe.pages["fms-metrics"].on_page_load = function (wrapper) {
+	const page = frappe.ui.make_app_page({
+		parent: wrapper,
+		title: __("FMS Metrics"),
+		single_column: true,
+	});
+
+	const hours = page.add_field({
+		fieldname: "hours",
+		label: __("Last Hours"),
+		fieldtype: "Select",
+		options: ["1", "6", "24"],
+		default: "24",
+		change: () => refresh(),
+	});
+	page.set_primary_action(__("Refresh"), () => refresh(), "refresh");
+
+	const $body = $('<div class="frappe-card p-3">').appendTo(page.main);
+
+	function refresh() {
+		frappe.call({
+			method: "dt_fms.public.py.fms_metrics.get_fms_metrics",
+			args: { hours: hours.get_value() },
+			callback: (r) => render(r.message || []),
+		});
+	}
+
+	function format_ms(value) {
+		return `${format_number(value, null, 0)} ms`;
+	}
+
+	// Percentiles are histogram bucket bounds; null is above the last bound
+	function format_bound(value) {
+		return value == null ? "&gt; 10000 ms" : `&le; ${format_ms(value)}`;
+	}
+
+	function render(rows) {
+		if (!rows.length) {
+			$body.html(`<p class="text-muted">${__("No FMS handler runs recorded in this period.")}</p>`);
+			return;
+		}
+
+		const headers = [
+			__("Handler"), __("Doctype"), __("Runs"), __("Errors"), __("Total"), __("Average"),
+			__("p50"), __("p95"), __("Avg Queries"), __("Created"), __("Updated"), __("Closed"),
+		];
+		const body = rows.map((row) => `
+			<tr>
+				<td>${frappe.utils.escape_html(row.handler)}</td>
+				<td>${frappe.utils.escape_html(row.doctype)}</td>
+				<td class="text-right">${row.count}</td>
+				<td class="text-right">${row.errors}</td>
+				<td class="text-right">${format_ms(row.total_ms)}</td>
+				<td class="text-right">${format_ms(row.avg_ms)}</td>
+				<td class="text-right">${format_bound(row.p50_ms)}</td>
+				<td class="text-right">${format_bound(row.p95_ms)}</td>
+				<td class="text-right">${format_number(row.avg_queries, null, 1)}</td>
+				<td class="text-right">${row.todos_created}</td>
+				<td class="text-right">${row.todos_updated}</td>
+				<td class="text-right">${row.todos_closed}</td>
+			</tr>`).join("");
+
+		$body.html(`
+			<table class="table table-bordered table-sm">
+				<thead><tr>${headers.map((h) => `<th>${h}</th>`).join("")}</tr></thead>
+				<tbody>${body}</tbody>
+			</table>`);
+	}
+
+	refresh();
+};
@@ -3,6 +3,11 @@
 
 frappe.query_reports["DT Task Delay Detail"] = {
 	"filters": [
-
+		{
+			"fieldname": "user",
+			"label": "User",
+			"fieldtype": "Link",
+			"options": "User"
+		}
 	]
 };
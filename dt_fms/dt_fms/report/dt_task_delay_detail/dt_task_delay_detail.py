@@ -1,9 +1,79 @@
 # Copyright (c) 2025, DT and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+from dt_fms.public.py.todo_assignment import DEFAULT_WORKING_HOURS, get_todo_calendars
+from dt_fms.public.py.todo_positions import CALENDAR_FIELD, get_current_positions, live_delay
+from dt_fms.public.py.user_calendar import FULL_DAY_HOURS
+from dt_fms.public.py.work_calendar_memo import calendar_memo
 
 
 def execute(filters=None):
-	columns, data = [], []
-	return columns, data
+	filters = frappe._dict(filters or {})
+
+	columns = [
+		{"label": "Task", "fieldname": "name", "fieldtype": "Link", "options": "ToDo", "width": 200},
+		{"label": "Assigned To", "fieldname": "allocated_to", "fieldtype": "Link", "options": "User", "width": 200},
+		{"label": "Reference Type", "fieldname": "reference_type", "fieldtype": "Link", "options": "DocType", "width": 150},
+		{"label": "Reference Name", "fieldname": "reference_name", "fieldtype": "Dynamic Link", "options": "reference_type", "width": 180},
+		{"label": "Expected End Time", "fieldname": "custom_expected_end_time", "fieldtype": "Datetime", "width": 180},
+		{"label": "Current Delay", "fieldname": "delay", "fieldtype": "Duration", "width": 180},
+	]
+
+	ToDo = frappe.qb.DocType("ToDo")
+	conditions = (ToDo.status == "Open") & ToDo.custom_expected_end_time.isnotnull()
+	if filters.get("user"):
+		conditions &= ToDo.allocated_to == filters.user
+
+	users = frappe.qb.from_(ToDo).select(ToDo.allocated_to).distinct().where(conditions).run(pluck=True)
+	if not users:
+		return columns, []
+
+	fields = (
+		ToDo.name,
+		ToDo.allocated_to,
+		ToDo.reference_type,
+		ToDo.reference_name,
+		ToDo.custom_expected_end_time,
+	)
+
+	# One current position per calendar; the delay of every ToDo on one of them is computed in SQL
+	positions = get_current_positions(users, (FULL_DAY_HOURS, DEFAULT_WORKING_HOURS))
+	delay = live_delay(ToDo, positions)
+
+	data = (
+		frappe.qb.from_(ToDo)
+		.select(*fields, delay.as_("delay"))
+		.where(conditions & (delay > 0))
+	).run(as_dict=True)
+
+	# ToDos without positions, or on a calendar that has since changed, go through the calendar
+	data.extend(get_unpositioned_delays(ToDo, fields, conditions, positions))
+
+	return columns, sorted(data, key=lambda row: row.delay, reverse=True)
+
+
+def get_unpositioned_delays(ToDo, fields, conditions, positions):
+	calendar = ToDo[CALENDAR_FIELD]
+	now = now_datetime()
+
+	todos = (
+		frappe.qb.from_(ToDo)
+		.select(*fields, ToDo.custom_row_reference)
+		.where(conditions & (ToDo.custom_expected_end_time < now))
+		.where(calendar.isnull() | calendar.notin(list(positions)))
+	).run(as_dict=True)
+
+	calendars = get_todo_calendars(todos)
+	data = []
+	for todo in todos:
+		todo.delay = calendar_memo.working_seconds(
+			calendars[todo.name], get_datetime(todo.custom_expected_end_time), now
+		)
+		if todo.delay > 0:
+			del todo["custom_row_reference"]
+			data.append(todo)
+
+	return data
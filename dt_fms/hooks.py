@@ -198,11 +198,13 @@ app_license = "mit"
 # ----------------
 # before_request = ["dt_fms.utils.before_request"]
 # after_request = ["dt_fms.utils.after_request"]
+after_request = ["dt_fms.public.py.fms_trace.flush_trace"]
 
 # Job Events
 # ----------
 # before_job = ["dt_fms.utils.before_job"]
 # after_job = ["dt_fms.utils.after_job"]
+after_job = ["dt_fms.public.py.fms_trace.flush_trace"]
 
 # User Data Protection
 # --------------------
@@ -241,15 +243,45 @@ app_license = "mit"
 # default_log_clearing_doctypes = {
 # 	"Logging DocType Name": 30  # days to retain logs
 # }
+default_log_clearing_doctypes = {
+	"FMS Trace Log": 7
+}
 
 
 doc_events = {
 	"*":{
-		"on_update":"dt_fms.public.py.master.on_update",
-		"before_save":"dt_fms.public.py.activity_assignment_monitor.on_update"
+		"on_update":"dt_fms.public.py.dispatch.on_update",
+		"before_save":"dt_fms.public.py.dispatch.before_save"
+	},
+	"Holiday List":{
+		"on_update":"dt_fms.public.py.user_calendar.clear_holiday_cache",
+		"on_trash":"dt_fms.public.py.user_calendar.clear_holiday_cache"
+	},
+	"Workflow":{
+		"on_update":"dt_fms.public.py.todo_assignment.clear_workflow_map",
+		"on_trash":"dt_fms.public.py.todo_assignment.clear_workflow_map"
+	},
+	"User":{
+		"on_update":"dt_fms.public.py.todo_assignment.clear_role_users_index",
+		"on_trash":"dt_fms.public.py.todo_assignment.clear_role_users_index",
+		"after_rename":"dt_fms.public.py.todo_assignment.clear_role_users_index"
+	},
+	"Role":{
+		"on_update":"dt_fms.public.py.todo_assignment.clear_role_users_index",
+		"on_trash":"dt_fms.public.py.todo_assignment.clear_role_users_index"
+	},
+	"ToDo":{
+		"on_update":"dt_fms.public.py.todo_load.on_todo_update",
+		"on_trash":"dt_fms.public.py.todo_load.on_todo_trash"
 	}
 }
 
+scheduler_events = {
+	"hourly": [
+		"dt_fms.public.py.todo_load.rebuild_open_load"
+	]
+}
+
 # doc_events = {
 # 	"*": {
 # 		"on_update": [
@@ -0,0 +1,36 @@
+import frappe
+
+from dt_fms.public.py.todo_assignment import get_todo_calendars
+from dt_fms.public.py.todo_positions import CALENDAR_FIELD, get_position_fields
+
+
+def execute():
+	"""
+	Store calendar positions on open ToDos created before ToDos kept them, so
+	the delay report can compute their delay in SQL
+	"""
+	todos = frappe.get_all(
+		"ToDo",
+		filters={"status": "Open", "custom_tat_start_time": ["is", "set"], CALENDAR_FIELD: ["is", "not set"]},
+		fields=[
+			"name",
+			"allocated_to",
+			"reference_type",
+			"custom_row_reference",
+			"custom_tat_start_time",
+			"custom_expected_end_time",
+		],
+	)
+
+	calendars = get_todo_calendars(todos)
+	for todo in todos:
+		frappe.db.set_value(
+			"ToDo",
+			todo.name,
+			get_position_fields(
+				calendars[todo.name],
+				start=todo.custom_tat_start_time,
+				expected_end=todo.custom_expected_end_time,
+			),
+			update_modified=False,
+		)
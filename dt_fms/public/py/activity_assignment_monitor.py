@@ -1,12 +1,18 @@
 import frappe
-from frappe.utils import now_datetime, add_to_date, cstr
+from frappe.utils import add_to_date, cstr, now_datetime
+
 from dt_fms.public.py.utils import is_applied_on_doctype, is_fms_enable
 
+RULE_FIELDS_CACHE_KEY = "dt_fms:activity_rule_fields"
+
 
 def on_update(doc, method):
     if not is_fms_enable() or not is_applied_on_doctype(doc):
         return
 
+    if not should_match_rules(doc):
+        return
+
     rule = get_matching_activity_assignment_rule(doc)
     if not rule:
         return
@@ -15,11 +21,63 @@ def on_update(doc, method):
     if not tasks:
         return
 
-    setattr(doc, "_activity_assignment_handled", True)
+    doc._activity_assignment_handled = True
 
     create_task_assignments(doc, tasks)
 
 
+def should_match_rules(doc) -> bool:
+    """
+    Whether rule conditions can evaluate differently than at the last save:
+    the doctype has enabled rules and the document is new or one of the
+    fields their conditions reference changed
+    """
+    fields = get_rule_condition_fields(doc.doctype)
+    if fields is None:
+        return False
+
+    if doc.is_new() or not doc.get_doc_before_save():
+        return True
+
+    return any(doc.has_value_changed(field) for field in fields)
+
+
+def get_rule_condition_fields(doctype: str) -> frozenset[str] | None:
+    """
+    Fields referenced by the conditions of the doctype's enabled rules,
+    None if it has no enabled rules. Cached until a rule is saved or deleted.
+    """
+    fields = frappe.cache.hget(RULE_FIELDS_CACHE_KEY, doctype)
+
+    if fields is None:
+        rules = frappe.get_all(
+            "Activity Assignment Rule",
+            filters={"document_type": doctype, "disable": 0},
+            pluck="name"
+        )
+        fields = frappe.get_all(
+            "Activity Assignment Rule Condition",
+            filters={"parenttype": "Activity Assignment Rule", "parent": ["in", rules]},
+            pluck="field",
+            distinct=True
+        ) if rules else False
+        frappe.cache.hset(RULE_FIELDS_CACHE_KEY, doctype, fields)
+
+    if fields is False:
+        return None
+    return frozenset(field for field in fields if field)
+
+
+def clear_rule_condition_fields(doc=None, method=None) -> None:
+    """
+    Drop the cached condition fields of every doctype, again once the rule
+    change is committed so fields re-cached in between from the old rows do
+    not outlive it
+    """
+    frappe.cache.delete_value(RULE_FIELDS_CACHE_KEY)
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(RULE_FIELDS_CACHE_KEY))
+
+
 def get_matching_activity_assignment_rule(doc):
     """Return the first matching rule that satisfies all conditions."""
     rules = frappe.get_all(
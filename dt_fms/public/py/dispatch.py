@@ -0,0 +1,59 @@
+"""
+Entry points for the "*" doc_events.
+
+Every save on the site passes through here, so the only work done for a
+document is one membership test against the cached FMS Settings snapshot.
+The FMS handlers are imported and called only for active doctypes.
+
+Records FMS writes itself (ToDos, comments, versions, logs) never reach the
+handlers: their doctypes are excluded outright, and anything saved inside
+utils.fms_writes() is skipped, so creating ToDos does not re-enter FMS.
+"""
+
+from dt_fms.public.py.utils import get_fms_settings, in_fms_write
+
+# Doctypes FMS writes or that are written as a side effect of its writes
+INTERNAL_DOCTYPES = frozenset({
+    "ToDo",
+    "Comment",
+    "Communication",
+    "Version",
+    "Activity Log",
+    "Notification Log",
+    "Error Log",
+    "Deleted Document",
+    "FMS Settings",
+    "FMS Trace Log",
+    "Delegation Sheet Revisions",
+})
+
+
+def is_fms_document(doc) -> bool:
+    """
+    Whether FMS is enabled and applied on the document's doctype,
+    and the document is not one FMS is writing itself
+    """
+    if doc.doctype in INTERNAL_DOCTYPES or in_fms_write():
+        return False
+
+    settings = get_fms_settings()
+    return settings.enabled and doc.doctype in settings.doctypes
+
+
+def on_update(doc, method=None):
+    if not is_fms_document(doc):
+        return
+
+    from dt_fms.public.py import master
+    master.on_update(doc, method)
+
+
+def before_save(doc, method=None):
+    if not is_fms_document(doc):
+        return
+
+    from dt_fms.public.py import activity_assignment_monitor
+    from dt_fms.public.py.fms_metrics import measure
+
+    with measure("Activity Assignment Rules", doc.doctype):
+        activity_assignment_monitor.on_update(doc, method)
@@ -0,0 +1,175 @@
+"""
+Cost of FMS handlers, per handler and doctype.
+
+Every handler invocation wrapped in measure() records its wall time, the
+number of database queries it ran and the ToDos it created, updated and
+closed. Invocations are aggregated in Redis into hourly windows, each a hash
+of counters and a latency histogram, and windows expire after a day. The
+whitelisted get_fms_metrics merges the windows for the FMS Metrics page.
+"""
+
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from time import perf_counter, time
+
+import frappe
+from frappe.utils import cint
+
+logger = logging.getLogger(__name__)
+
+METRICS_CACHE_KEY = "dt_fms:metrics"
+WINDOW_SECONDS = 3600
+RETAINED_WINDOWS = 24
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+TODO_ACTIONS = ("created", "updated", "closed")
+
+
+class Measurement:
+    """Cost of one handler invocation"""
+
+    def __init__(self, handler: str, doctype: str):
+        self.handler = handler
+        self.doctype = doctype
+        self.seconds = 0.0
+        self.queries = 0
+        self.failed = False
+        self.todos = dict.fromkeys(TODO_ACTIONS, 0)
+
+
+@contextmanager
+def measure(handler: str, doctype: str) -> Iterator[Measurement]:
+    """
+    Record the cost of the block as one invocation of handler on doctype.
+    Queries are counted by wrapping frappe.db.sql for the duration of the
+    block, the way the request recorder does.
+    """
+    measurement = Measurement(handler, doctype)
+    parent = getattr(frappe.local, "fms_measurement", None)
+    frappe.local.fms_measurement = measurement
+
+    db = frappe.db
+    own_sql = db.__dict__.get("sql")
+    sql = db.sql
+
+    def counted_sql(*args, **kwargs):
+        measurement.queries += 1
+        return sql(*args, **kwargs)
+
+    db.sql = counted_sql
+    started = perf_counter()
+    try:
+        yield measurement
+    except Exception:
+        measurement.failed = True
+        raise
+    finally:
+        measurement.seconds = perf_counter() - started
+        if own_sql is None:
+            del db.sql
+        else:
+            db.sql = own_sql
+        frappe.local.fms_measurement = parent
+        record(measurement)
+
+
+def count_todos(action: str, count: int = 1) -> None:
+    """
+    Add ToDos created, updated or closed to the handler being measured, if any
+    """
+    measurement = getattr(frappe.local, "fms_measurement", None)
+    if measurement is not None:
+        measurement.todos[action] += count
+
+
+def latency_bucket(milliseconds: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if milliseconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def get_window_key(window: int) -> str:
+    return frappe.cache.make_key(f"{METRICS_CACHE_KEY}:{window}")
+
+
+def record(measurement: Measurement) -> None:
+    """
+    Add one invocation to the current window, in one Redis round trip
+    """
+    milliseconds = measurement.seconds * 1000
+    prefix = f"{measurement.handler}|{measurement.doctype}|"
+    key = get_window_key(int(time() // WINDOW_SECONDS))
+
+    try:
+        pipe = frappe.cache.pipeline()
+        pipe.hincrby(key, prefix + "count", 1)
+        pipe.hincrbyfloat(key, prefix + "ms", milliseconds)
+        pipe.hincrby(key, prefix + latency_bucket(milliseconds), 1)
+        if measurement.queries:
+            pipe.hincrby(key, prefix + "queries", measurement.queries)
+        if measurement.failed:
+            pipe.hincrby(key, prefix + "errors", 1)
+        for action, count in measurement.todos.items():
+            if count:
+                pipe.hincrby(key, prefix + f"todos_{action}", count)
+        pipe.expire(key, WINDOW_SECONDS * (RETAINED_WINDOWS + 1))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record FMS metrics: {e!s}")
+
+
+def percentile(stats: dict[str, float], fraction: float) -> float | None:
+    """
+    Upper bound of the latency bucket holding the given fraction of invocations,
+    None when it is above the last bound
+    """
+    target = stats.get("count", 0) * fraction
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS:
+        seen += stats.get(f"le_{bound}", 0)
+        if seen >= target:
+            return bound
+    return None
+
+
+@frappe.whitelist()
+def get_fms_metrics(hours=RETAINED_WINDOWS) -> list[dict]:
+    """
+    Cost of FMS handlers per handler and doctype over the last hours,
+    costliest first
+    """
+    frappe.only_for("System Manager")
+
+    hours = min(max(cint(hours), 1), RETAINED_WINDOWS)
+    current = int(time() // WINDOW_SECONDS)
+
+    pipe = frappe.cache.pipeline()
+    for window in range(current - hours + 1, current + 1):
+        pipe.hgetall(get_window_key(window))
+
+    totals: dict[tuple, dict[str, float]] = {}
+    for window in pipe.execute():
+        for field, value in window.items():
+            handler, doctype, stat = frappe.safe_decode(field).split("|")
+            stats = totals.setdefault((handler, doctype), {})
+            stats[stat] = stats.get(stat, 0) + float(value)
+
+    metrics = []
+    for (handler, doctype), stats in totals.items():
+        count = stats.get("count") or 1
+        metrics.append({
+            "handler": handler,
+            "doctype": doctype,
+            "count": int(stats.get("count", 0)),
+            "errors": int(stats.get("errors", 0)),
+            "total_ms": stats.get("ms", 0),
+            "avg_ms": stats.get("ms", 0) / count,
+            "p50_ms": percentile(stats, 0.5),
+            "p95_ms": percentile(stats, 0.95),
+            "avg_queries": stats.get("queries", 0) / count,
+            **{f"todos_{action}": int(stats.get(f"todos_{action}", 0)) for action in TODO_ACTIONS},
+        })
+
+    return sorted(metrics, key=lambda row: row["total_ms"], reverse=True)
@@ -0,0 +1,111 @@
+"""
+Opt-in tracing for TAT and ToDo assignment.
+
+Tracing is decided once per request or job and is off unless either
+- the request carries the X-FMS-Trace header (or fms_trace form value) and
+  the user is a System Manager, or
+- TAT tracing is enabled in FMS Settings for the session user.
+
+When it is off, trace() is one attribute lookup and messages are never
+formatted. When it is on, messages are buffered and written to FMS Trace Log
+by a background job once the request or job is finished.
+"""
+
+import logging
+from time import perf_counter
+
+import frappe
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-FMS-Trace"
+TRACE_PARAM = "fms_trace"
+TRACE_ROLE = "System Manager"
+
+
+class Trace:
+    """Messages captured during one request or job"""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.entries: list[str] = []
+
+
+def tracing() -> bool:
+    """
+    Whether the current request or job is being traced
+    """
+    state = getattr(frappe.local, "fms_trace", None)
+    if state is None:
+        state = frappe.local.fms_trace = Trace() if should_trace() else False
+    return state is not False
+
+
+def trace(message: str, *args) -> None:
+    """
+    Capture a %-style message; args are only formatted when tracing is on
+    """
+    if not tracing():
+        return
+
+    state = frappe.local.fms_trace
+    if args:
+        message = message % args
+
+    elapsed = (perf_counter() - state.started) * 1000
+    state.entries.append(f"[{elapsed:9.2f} ms] {message}")
+    logger.debug(message)
+
+
+def should_trace() -> bool:
+    """
+    Decide whether to trace the current request or job
+    """
+    if not getattr(frappe.local, "db", None) or frappe.flags.in_install or frappe.flags.in_migrate:
+        return False
+
+    request = getattr(frappe.local, "request", None)
+    if request is not None and (request.headers.get(TRACE_HEADER) or frappe.form_dict.get(TRACE_PARAM)):
+        if TRACE_ROLE in frappe.get_roles():
+            return True
+
+    if not frappe.db.get_single_value("FMS Settings", "enable_tat_trace", cache=True):
+        return False
+
+    trace_users = (frappe.db.get_single_value("FMS Settings", "trace_users", cache=True) or "").split()
+    return not trace_users or frappe.session.user in trace_users
+
+
+def flush_trace(request=None, method: str | None = None, **kwargs) -> None:
+    """
+    after_request / after_job hook: queue captured messages for FMS Trace Log
+    """
+    state = getattr(frappe.local, "fms_trace", None)
+    frappe.local.fms_trace = None
+
+    if not state or not state.entries:
+        return
+
+    try:
+        frappe.enqueue(
+            "dt_fms.public.py.fms_trace.save_trace",
+            queue="short",
+            user=frappe.session.user,
+            source=request.path if request is not None else method,
+            entries=state.entries,
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue FMS trace: {e!s}", exc_info=True)
+
+
+def save_trace(user: str, source: str | None, entries: list[str]) -> None:
+    """
+    Store captured messages as an FMS Trace Log
+    """
+    frappe.get_doc({
+        "doctype": "FMS Trace Log",
+        "user": user,
+        "source": source,
+        "entries": len(entries),
+        "trace": "\n".join(entries),
+    }).insert(ignore_permissions=True)
@@ -1,22 +1,167 @@
+import logging
+
 import frappe
-import dt_fms.public.py.todo_assignment as todo_assignment
+
 import dt_fms.public.py.manual_todo_assignment as manual_todo_assignment
-import dt_fms.public.py.activity_assignment_monitor as activity_assignment_monitor
+import dt_fms.public.py.todo_assignment as todo_assignment
+from dt_fms.public.py.fms_metrics import measure
+from dt_fms.public.py.utils import get_fms_settings
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_SYNC_METHOD = "dt_fms.public.py.master.run_deferred_sync"
+SYNC_PENDING_CACHE_KEY = "dt_fms:sync_pending"
+# A flag whose job was lost stops holding back new jobs after this long
+SYNC_PENDING_TTL = 60 * 60
+# Upper bound on the syncs one deferred job runs for a document still being saved
+MAX_DEFERRED_SYNC_PASSES = 5
+
+
+class DirtyDocument:
+    """An FMS document saved in the current transaction, synced once at commit"""
+
+    def __init__(self, doc, previous_state: str | None):
+        self.doc = doc
+        # Workflow state before the first save in this transaction
+        self.previous_state = previous_state
 
 
 def on_update(doc, method):
-    # Call each on_update separately, handle exceptions to avoid blocking
+    mark_dirty(doc)
+
+
+def mark_dirty(doc) -> None:
+    """
+    Record a saved document for one consolidated sync when the transaction
+    commits. Later saves of the same document only replace the instance.
+    """
+    dirty: dict[tuple[str, str], DirtyDocument] = getattr(frappe.local, "fms_dirty", None)
+    if dirty is None:
+        dirty = frappe.local.fms_dirty = {}
+        frappe.db.before_commit.add(flush_dirty)
+        frappe.db.after_rollback.add(clear_dirty)
+
+    key = (doc.doctype, doc.name)
+    if key in dirty:
+        dirty[key].doc = doc
+        return
+
+    doc_before_save = doc.get_doc_before_save()
+    dirty[key] = DirtyDocument(
+        doc, doc_before_save.get("workflow_state") if doc_before_save else None
+    )
+
+
+def clear_dirty() -> None:
+    frappe.local.fms_dirty = None
+
+
+def flush_dirty() -> None:
+    """
+    before_commit callback: sync every recorded document once, in the
+    transaction that saved it, or queue its job for Deferred doctypes
+    """
+    deferred = get_fms_settings().deferred
+
+    # Syncing may save further FMS documents; they are picked up by the next pass
+    while getattr(frappe.local, "fms_dirty", None):
+        dirty = frappe.local.fms_dirty
+        frappe.local.fms_dirty = {}
+
+        for entry in dirty.values():
+            if entry.doc.doctype in deferred:
+                enqueue_sync(entry.doc, entry.previous_state)
+            else:
+                sync_document(entry.doc, entry.previous_state)
+
+    clear_dirty()
+
+
+def sync_document(doc, previous_state: str | None = None) -> None:
+    """
+    Bring the document's ToDos in line with its current workflow state and task rows
+    """
+    # Call each handler separately, handle exceptions to avoid blocking
     try:
-        todo_assignment.on_update(doc, method)
+        if doc.get("workflow_state") and doc.workflow_state != previous_state:
+            with measure("Workflow ToDos", doc.doctype):
+                todo_assignment.handle_workflow_state_change(doc, previous_state)
     except Exception as e:
-        frappe.log_error(f"assignment.on_update error: {str(e)}", "Workflow Automation")
+        frappe.log_error(f"assignment.on_update error: {e!s}", "Workflow Automation")
+
+    try:
+        with measure("Task Assignment ToDos", doc.doctype):
+            manual_todo_assignment.on_update(doc, "on_update")
+    except Exception as e:
+        frappe.log_error(f"manual_todo_assignment.on_update error: {e!s}", "Manual ToDo Assignment")
+
+
+def get_pending_key(doctype: str, docname: str) -> str:
+    return frappe.cache.make_key(f"{SYNC_PENDING_CACHE_KEY}:{doctype}:{docname}")
+
 
+def enqueue_sync(doc, previous_state: str | None = None) -> None:
+    """
+    Queue the sync of a Deferred doctype's document once the transaction commits.
+
+    Saves are coalesced by a per-document pending flag. A committed save sets
+    it and queues a job only if it was not already set. The job clears the
+    flag before each pass and then reads the document. A save committed after
+    that queues a new job, so none is lost while a job is running.
+    """
+    doctype, docname = doc.doctype, doc.name
+    frappe.db.after_commit.add(lambda: queue_sync(doctype, docname, previous_state))
+
+
+def queue_sync(doctype: str, docname: str, previous_state: str | None) -> None:
     try:
-        manual_todo_assignment.on_update(doc, method)
+        if not frappe.cache.set(get_pending_key(doctype, docname), 1, nx=True, ex=SYNC_PENDING_TTL):
+            # A queued job, or the next pass of a running one, will read this save
+            return
     except Exception as e:
-        frappe.log_error(f"manual_todo_assignment.on_update error: {str(e)}", "Manual ToDo Assignment")
+        logger.warning(f"Failed to set sync pending flag for {doctype} {docname}: {e!s}")
+
+    frappe.enqueue(
+        DEFERRED_SYNC_METHOD,
+        queue="default",
+        doctype=doctype,
+        docname=docname,
+        previous_state=previous_state,
+    )
+
+
+def run_deferred_sync(doctype: str, docname: str, previous_state: str | None = None) -> None:
+    """
+    Background sync of a document of a Deferred doctype, against its latest saved state.
+    Syncs again while saves keep setting the pending flag, up to
+    MAX_DEFERRED_SYNC_PASSES, then hands over to a new job.
+    """
+    settings = get_fms_settings()
+    if not settings.enabled or doctype not in settings.doctypes:
+        return
+
+    for _ in range(MAX_DEFERRED_SYNC_PASSES):
+        # Clearing the flag and checking that it was set is one DEL
+        if not frappe.cache.delete(get_pending_key(doctype, docname)):
+            return
+        # Read the document in a transaction that starts after the flag was cleared
+        frappe.db.commit()
+
+        if not frappe.db.exists(doctype, docname):
+            return
+
+        doc = frappe.get_doc(doctype, docname)
+        sync_document(doc, previous_state)
+        frappe.db.commit()
+        previous_state = doc.get("workflow_state")
 
-    # try:
-    #     activity_assignment_monitor.on_update(doc, method)
-    # except Exception as e:
-    #     frappe.log_error(f"activity_assignment_monitor.on_update error: {str(e)}", "Activity Assignment Monitor")
+    logger.warning(
+        f"{doctype} {docname} still being saved after {MAX_DEFERRED_SYNC_PASSES} syncs, queueing another"
+    )
+    frappe.enqueue(
+        DEFERRED_SYNC_METHOD,
+        queue="default",
+        doctype=doctype,
+        docname=docname,
+        previous_state=previous_state,
+    )
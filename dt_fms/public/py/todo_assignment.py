@@ -1,9 +1,29 @@
-import frappe
-from frappe.utils import now, get_datetime, getdate
-from datetime import datetime, timedelta, time
-from typing import Optional, Dict, List, Set, Union
 import logging
-from dt_fms.public.py.utils import (is_applied_on_doctype, is_fms_enable)
+from collections.abc import Iterable
+from datetime import datetime, time
+from time import sleep
+from typing import NamedTuple
+
+import frappe
+from frappe.utils import get_datetime, now
+
+from dt_fms.public.py.fms_metrics import count_todos
+from dt_fms.public.py.fms_trace import trace, tracing
+from dt_fms.public.py.todo_bulk import insert_todos, update_todos
+from dt_fms.public.py.todo_load import FAN_OUT, adjust_open_load, pick_assignee
+from dt_fms.public.py.todo_positions import (
+    CALENDAR_FIELD,
+    CLOSE_POSITION_FIELD,
+    START_POSITION_FIELD,
+    get_position_fields,
+    get_time_taken,
+    has_positions,
+)
+from dt_fms.public.py.transition_guard import RETRY_BACKOFF_SECONDS, claim_transition
+from dt_fms.public.py.user_calendar import FULL_DAY_HOURS, get_user_calendars
+from dt_fms.public.py.utils import fms_writes, is_fms_enable
+from dt_fms.public.py.work_calendar import WorkCalendar
+from dt_fms.public.py.work_calendar_memo import calendar_memo
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,13 +31,20 @@ logger = logging.getLogger(__name__)
 # Constants
 DEFAULT_WORK_START_TIME = time(9, 0, 0)  # 9:00 AM
 DEFAULT_WORK_END_TIME = time(18, 0, 0)   # 6:00 PM
+DEFAULT_WORKING_HOURS = (DEFAULT_WORK_START_TIME, DEFAULT_WORK_END_TIME)
 # MAX_TAT_SECONDS = 30 * 24 * 60 * 60      # 30 days in seconds
 DATE_FORMAT = "%Y-%m-%d"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+WORKFLOW_MAP_CACHE_KEY = "dt_fms:workflow_map"
+ROLE_USERS_CACHE_KEY = "dt_fms:role_users"
+# Desk users who never receive workflow ToDos
+EXCLUDED_USERS = ("Administrator", "Guest")
 
-class WorkflowAutomationException(Exception):
-    """Custom exception for workflow automation errors"""
-    pass
+class StateAssignment(NamedTuple):
+    """Who gets ToDos in a workflow state, and with what TAT"""
+    tat: int | None
+    roles: frozenset[str]
+    routing: str = FAN_OUT
 
 
 # def maximum_tat_time(doc):
@@ -56,64 +83,129 @@ class WorkflowAutomationException(Exception):
 
 #     return len(applied_on_doc) > 0
 
-def on_update(doc, method: str) -> None:
+def handle_workflow_state_change(doc, previous_state: str | None = None, attempt: int = 0) -> None:
     """
-    Entry point for document updates. Handles workflow state changes.
+    Main handler for workflow state changes.
+    previous_state defaults to the state before the document's last save.
     """
-    try:
-        if not is_fms_enable():
-            return
+    if previous_state is None and doc.get_doc_before_save():
+        previous_state = doc.get_doc_before_save().get('workflow_state')
+    current_state = doc.get('workflow_state')
 
-        if not is_applied_on_doctype(doc):
-            return
+    # Retries and double submits stop here, before any query; a transition
+    # held up by another worker is queued for retry_workflow_state_change
+    if not claim_transition(doc, previous_state, attempt):
+        trace("Not processing transition %s -> %s on %s %s here", previous_state, current_state, doc.doctype, doc.name)
+        return
 
-        if not hasattr(doc, 'workflow_state'):
-            return
+    workflow = get_workflow_map(doc.doctype)
+    if workflow is None:
+        return
 
-        if not doc.has_value_changed('workflow_state'):
-            return
+    with fms_writes():
+        # First close all open todos for this document
+        close_all_open_todos_for_doc(doc)
+
+        # Then create todos only for current state
+        create_current_state_todos(doc, current_state, workflow)
+
+def retry_workflow_state_change(
+    doctype: str,
+    docname: str,
+    previous_state: str | None,
+    workflow_state: str | None,
+    modified: str,
+    attempt: int
+) -> None:
+    """
+    Background retry of a transition whose document was locked by another worker.
+    Skipped if the document has been saved since; that save is processed itself.
+    """
+    # Give the other worker time to commit, before this job reads anything
+    sleep(RETRY_BACKOFF_SECONDS * attempt)
 
-        logger.info(
-            f"Workflow state changed for {doc.doctype} {doc.name} "
-            f"from {doc.get_doc_before_save().get('workflow_state') if doc.get_doc_before_save() else None} "
-            f"to {doc.workflow_state}"
-        )
+    if not is_fms_enable() or not frappe.db.exists(doctype, docname):
+        return
 
-        handle_workflow_state_change(doc)
+    doc = frappe.get_doc(doctype, docname)
+    if doc.get('workflow_state') != workflow_state or str(doc.modified) != modified:
+        logger.info(f"Dropping retry of stale transition on {doctype} {docname}")
+        return
 
-    except Exception as e:
-        logger.error(
-            f"Failed to process workflow state change for {doc.doctype} {doc.name}: {str(e)}",
-            exc_info=True
+    handle_workflow_state_change(doc, previous_state, attempt)
+
+
+def get_workflow_map(doctype: str) -> dict[str, StateAssignment] | None:
+    """
+    Compiled map of the doctype's active workflow: state -> TAT and allowed roles
+    of its TAT-applicable transitions. None if the doctype has no active workflow.
+    Cached until a Workflow is saved or deleted.
+    """
+    cached = frappe.cache.hget(WORKFLOW_MAP_CACHE_KEY, doctype)
+    if cached is None:
+        workflow = get_active_workflow(doctype)
+        cached = compile_workflow(workflow) if workflow else False
+        frappe.cache.hset(WORKFLOW_MAP_CACHE_KEY, doctype, cached)
+
+    if cached is False:
+        return None
+
+    return {
+        state: StateAssignment(tat, frozenset(roles), *routing)
+        for state, (tat, roles, *routing) in cached.items()
+    }
+
+
+def compile_workflow(workflow) -> dict[str, tuple]:
+    """
+    Cacheable state -> (TAT seconds, allowed roles, routing mode) map of a
+    Workflow document. The TAT and routing mode of a state are those of its
+    first TAT-applicable transition.
+    """
+    compiled = {}
+    for state in {t.state for t in workflow.transitions}:
+        transitions = get_transitions_with_tat(state, workflow)
+        if not transitions:
+            continue
+
+        compiled[state] = (
+            validate_tat(transitions[0].custom_tat, f"{workflow.name} ({state})"),
+            sorted(get_allowed_roles_from_transitions(transitions)),
+            transitions[0].get("custom_routing_mode") or FAN_OUT
         )
-        raise WorkflowAutomationException(
-            f"Workflow automation failed: {str(e)}"
-        ) from e
 
+    return compiled
 
 
-def handle_workflow_state_change(doc) -> None:
+def validate_tat(tat, context: str) -> int | None:
     """
-    Main handler for workflow state changes
+    TAT in seconds, None if missing or not positive
     """
-    workflow = get_active_workflow(doc.doctype)
-    if not workflow:
-        return
+    try:
+        tat = int(tat)
+        # max_tat_seconds = maximum_tat_time(doc)
 
-    previous_state = (
-        doc.get_doc_before_save().get('workflow_state')
-        if doc.get_doc_before_save()
-        else None
-    )
-    current_state = doc.get('workflow_state')
+        if tat is None or tat <= 0:
+            logger.warning(f"Invalid TAT value {tat} for {context}")
+            tat = None
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid TAT value {tat} for {context}")
+        tat = None
+
+    return tat
 
-    # First close all open todos for this document
-    close_all_open_todos_for_doc(doc)
 
-    # Then create todos only for current state
-    create_current_state_todos(doc, current_state, workflow)
+def clear_workflow_map(doc=None, method=None) -> None:
+    """
+    Drop the compiled workflow maps; a Workflow may change its doctype.
+    Dropped again once the change is committed, so a map compiled in between
+    from the old transitions does not outlive it.
+    """
+    frappe.cache.delete_value(WORKFLOW_MAP_CACHE_KEY)
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(WORKFLOW_MAP_CACHE_KEY))
+
 
-def get_active_workflow(doctype: str) -> Optional[dict]:
+def get_active_workflow(doctype: str) -> dict | None:
     """
     Get active workflow for doctype
     """
@@ -132,7 +224,7 @@ def get_active_workflow(doctype: str) -> Optional[dict]:
         return frappe.get_doc("Workflow", workflow[0].name)
 
     except Exception as e:
-        logger.error(f"Error fetching workflow for {doctype}: {str(e)}", exc_info=True)
+        logger.error(f"Error fetching workflow for {doctype}: {e!s}", exc_info=True)
         return None
 
 def close_all_open_todos_for_doc(doc) -> None:
@@ -147,7 +239,10 @@ def close_all_open_todos_for_doc(doc) -> None:
                 "reference_name": doc.name,
                 "status": "Open"
             },
-            fields=["name", "allocated_to", "custom_tat_start_time", "custom_tat"]
+            fields=[
+                "name", "allocated_to", "custom_tat_start_time", "custom_tat",
+                CALENDAR_FIELD, START_POSITION_FIELD
+            ]
         )
 
         if not open_todos:
@@ -155,128 +250,152 @@ def close_all_open_todos_for_doc(doc) -> None:
 
         current_time = now()
         current_user = frappe.session.user
+        calendars = get_user_calendars(
+            {todo.allocated_to for todo in open_todos},
+            default_hours=DEFAULT_WORKING_HOURS
+        )
 
+        # One close position per calendar; time taken is then a subtraction
+        # for every ToDo whose start position is on the same calendar
+        end_time = get_datetime(current_time)
+        close_positions = {
+            calendar: calendar.position(end_time) for calendar in set(calendars.values())
+        }
+
+        updates = {}
         for todo in open_todos:
             try:
-                working_hours = get_user_working_hours(todo.allocated_to)
-                holidays = get_holidays_for_user(todo.allocated_to)
-
-                if holidays:
-                    print(f"Holidays for {todo.allocated_to}: {holidays}")
-
-                time_taken = calculate_actual_working_time(
-                    start_time=todo.custom_tat_start_time,
-                    end_time=current_time,
-                    working_hours_start=working_hours.get("start_time"),
-                    working_hours_end=working_hours.get("end_time"),
-                    holidays=holidays
-                )
-
-                # print("\n\n\n\n\nTodo Details:")
-                # print(f"Name: {todo.name}")
-                # print(f"Allocated To: {todo.allocated_to}")
-                # print(f"TT = ", time_taken)
-
-                frappe.db.set_value("ToDo", todo.name, {
+                calendar = calendars[todo.allocated_to]
+                close_position = close_positions[calendar]
+                time_taken = float(get_time_taken(todo, calendar, end_time, close_position))
+
+                if tracing():
+                    trace(
+                        "Closing ToDo %s for %s: started %s, time taken %ss, holidays %s",
+                        todo.name, todo.allocated_to, todo.custom_tat_start_time,
+                        time_taken, sorted(calendar.holidays)
+                    )
+
+                values = {
                     "status": "Closed",
                     "custom_tat_close_time": current_time,
                     "custom_closed_by": current_user,
                     "custom_time_taken_to_close": time_taken,
                     "custom_time_delay": calculate_extra_time_taken(todo.custom_tat, time_taken)
-                })
+                }
+                if has_positions(todo, calendar):
+                    values[CLOSE_POSITION_FIELD] = close_position
 
-                logger.info(f"Closed todo {todo.name}")
+                updates[todo.name] = values
 
             except Exception as e:
-                logger.error(f"Failed to close todo {todo.name}: {str(e)}", exc_info=True)
+                logger.error(f"Failed to close todo {todo.name}: {e!s}", exc_info=True)
+
+        # One UPDATE for every ToDo of the document
+        update_todos(updates, doc.doctype, doc.name)
+        adjust_open_load(
+            (todo.allocated_to, -1, -(todo.custom_tat or 0))
+            for todo in open_todos if todo.name in updates
+        )
+        count_todos("closed", len(updates))
+        logger.info(f"Closed {len(updates)} todos on {doc.doctype} {doc.name}")
 
     except Exception as e:
         logger.error(
-            f"Error closing todos for {doc.doctype} {doc.name}: {str(e)}",
+            f"Error closing todos for {doc.doctype} {doc.name}: {e!s}",
             exc_info=True
         )
 
-def create_current_state_todos(doc, current_state: str, workflow) -> None:
+def create_current_state_todos(doc, current_state: str, workflow: dict[str, StateAssignment]) -> None:
     """
     Create todos for users who can transition from current state
     """
-    transitions = get_transitions_with_tat(current_state, workflow)
-    if not transitions:
+    assignment = workflow.get(current_state)
+    if not assignment or not assignment.roles:
         return
 
-    allowed_roles = get_allowed_roles_from_transitions(transitions)
-    if not allowed_roles:
-        return
-
-    users = get_users_with_roles(allowed_roles)
+    users = get_users_with_roles(assignment.roles)
     if not users:
         return
 
+    if assignment.routing != FAN_OUT:
+        # Single assignee: one ToDo, chosen from the load counters
+        user = pick_assignee(assignment.routing, users, doc.doctype, current_state)
+        trace("%s routing on %s %s picked %s", assignment.routing, doc.doctype, doc.name, user)
+        if not user:
+            # Only Fan-out assigns everyone; leave the state unassigned rather than fall back to it
+            logger.error(
+                f"Routing mode {assignment.routing!r} picked no assignee for "
+                f"{doc.doctype} {doc.name} in state {current_state}; no ToDo created"
+            )
+            return
+        users = [user]
+
     reference_type = doc.doctype
     reference_name = doc.name
     description = f"Please review {reference_type}: {reference_name} (Current State: {current_state})"
     current_time = now()
     assigned_by = frappe.session.user
+    tat = assignment.tat
+
+    calendars = get_user_calendars(users, default_hours=DEFAULT_WORKING_HOURS)
+    # Users sharing a calendar share the expected end time and its positions
+    expected_end_times = {}
+    rows = []
 
     for user in users:
         try:
-            working_hours = get_user_working_hours(user)
-            holidays = get_holidays_for_user(user)
-            tat = transitions[0].custom_tat
-
-            # Validate TAT
-            try:
-                tat = int(tat)
-                # max_tat_seconds = maximum_tat_time(doc)
-
-                if tat is None or tat <= 0:
-                    logger.warning(f"Invalid TAT value {tat} for {reference_type} {reference_name}")
-                    tat = None
-            except (TypeError, ValueError):
-                logger.warning(f"Invalid TAT value {tat} for {reference_type} {reference_name}")
-                tat = None
-
-            expected_end_time = (
-                calculate_expected_end_time(
-                    start_time=current_time,
-                    tat_seconds=tat,
-                    working_hours_start=working_hours.get("start_time"),
-                    working_hours_end=working_hours.get("end_time"),
-                    holidays=holidays
+            calendar = calendars[user]
+
+            if id(calendar) not in expected_end_times:
+                expected_end_time = (
+                    calculate_expected_end_time(
+                        start_time=current_time,
+                        tat_seconds=tat,
+                        calendar=calendar
+                    )
+                    if tat
+                    else None
                 )
-                if tat
-                else None
-            )
+                expected_end_times[id(calendar)] = (
+                    expected_end_time,
+                    get_position_fields(calendar, start=current_time, expected_end=expected_end_time)
+                )
+            expected_end_time, position_fields = expected_end_times[id(calendar)]
 
-            if expected_end_time:
-                print("\n\n\n\n\n\n\n\nExpected End Time = ", expected_end_time, "\n\n\n")
+            if tracing():
+                trace(
+                    "Expected end time for %s on %s %s: %s (TAT %ss from %s)",
+                    user, reference_type, reference_name, expected_end_time, tat, current_time
+                )
 
-            todo = frappe.get_doc({
-                "doctype": "ToDo",
+            rows.append({
                 "allocated_to": user,
                 "description": description,
-                "reference_type": reference_type,
-                "reference_name": reference_name,
                 "priority": "Medium",
-                "assigned_by": assigned_by,
                 "custom_tat": tat,
                 "custom_tat_start_time": current_time,
                 "custom_expected_end_time": (
                     expected_end_time.strftime(DATETIME_FORMAT)
                     if expected_end_time
-                    else None)
+                    else None),
+                **position_fields
             })
-            todo.insert(ignore_permissions=True)
-            logger.info(f"Created todo for user {user} on {reference_type} {reference_name}")
 
         except Exception as e:
             logger.error(
                 f"Failed to create ToDo for user {user} on {reference_type} "
-                f"{reference_name}: {str(e)}",
+                f"{reference_name}: {e!s}",
                 exc_info=True
             )
 
-def get_transitions_with_tat(state: str, workflow) -> List[dict]:
+    # One multi-row insert for the whole fan-out
+    names = insert_todos(rows, reference_type, reference_name, assigned_by)
+    adjust_open_load((row["allocated_to"], 1, row["custom_tat"] or 0) for row in rows)
+    count_todos("created", len(names))
+    logger.info(f"Created {len(names)} todos on {reference_type} {reference_name}")
+
+def get_transitions_with_tat(state: str, workflow) -> list[dict]:
     """
     Get transitions with TAT applicable for given state
     """
@@ -285,7 +404,7 @@ def get_transitions_with_tat(state: str, workflow) -> List[dict]:
         if t.state == state and getattr(t, 'custom_tat_applicable', False)
     ]
 
-def get_allowed_roles_from_transitions(transitions: List[dict]) -> Set[str]:
+def get_allowed_roles_from_transitions(transitions: list[dict]) -> set[str]:
     """
     Extract unique allowed roles from transitions
     """
@@ -299,21 +418,74 @@ def get_allowed_roles_from_transitions(transitions: List[dict]) -> Set[str]:
             )
     return allowed_roles
 
-def get_users_with_roles(roles: Set[str]) -> List[str]:
+def get_users_with_roles(roles: Iterable[str]) -> list[str]:
     """
-    Get unique users with any of the specified roles
+    Get unique enabled desk users with any of the specified roles
     """
     try:
-        return frappe.get_all(
-            "Has Role",
-            filters={"role": ["in", list(roles)], "parenttype": "User"},
-            pluck="parent",
-            distinct=True
-        )
+        index = get_role_users_index()
+        users = set()
+        for role in roles:
+            users.update(index.get(role, ()))
+        return sorted(users)
     except Exception as e:
-        logger.error(f"Error fetching users with roles {roles}: {str(e)}", exc_info=True)
+        logger.error(f"Error fetching users with roles {roles}: {e!s}", exc_info=True)
         return []
 
+def get_role_users_index() -> dict[str, frozenset[str]]:
+    """
+    Role -> enabled desk users holding it, Administrator excluded.
+    Kept in request-local memory and in Redis until a User or Role changes.
+    """
+    index = getattr(frappe.local, "fms_role_users", None)
+    if index is not None:
+        return index
+
+    cached = frappe.cache.get_value(ROLE_USERS_CACHE_KEY)
+    if cached is None:
+        cached = build_role_users_index()
+        frappe.cache.set_value(ROLE_USERS_CACHE_KEY, cached)
+
+    index = frappe.local.fms_role_users = {
+        role: frozenset(users) for role, users in cached.items()
+    }
+    return index
+
+def build_role_users_index() -> dict[str, list[str]]:
+    """
+    Cacheable role -> users map, read in one query
+    """
+    has_role = frappe.qb.DocType("Has Role")
+    user = frappe.qb.DocType("User")
+
+    rows = (
+        frappe.qb.from_(has_role)
+        .join(user).on(user.name == has_role.parent)
+        .select(has_role.role, has_role.parent)
+        .where(
+            (has_role.parenttype == "User")
+            & (user.enabled == 1)
+            & (user.user_type == "System User")
+            & (user.name.notin(EXCLUDED_USERS))
+        )
+        .distinct()
+        .run()
+    )
+
+    index: dict[str, list[str]] = {}
+    for role, user_name in rows:
+        index.setdefault(role, []).append(user_name)
+    return index
+
+def clear_role_users_index(doc=None, method=None, *args, **kwargs) -> None:
+    """
+    User / Role doc_events: drop the role -> users index, again once the
+    change is committed so an index rebuilt in between does not outlive it
+    """
+    frappe.cache.delete_value(ROLE_USERS_CACHE_KEY)
+    frappe.db.after_commit.add(lambda: frappe.cache.delete_value(ROLE_USERS_CACHE_KEY))
+    frappe.local.fms_role_users = None
+
 def calculate_extra_time_taken(tat: float, time_taken: float) -> float:
     """
     Calculate extra time taken compared to TAT
@@ -328,97 +500,40 @@ def calculate_extra_time_taken(tat: float, time_taken: float) -> float:
         )
         return 0
 
-def get_holidays_for_user(user: str) -> List[datetime.date]:
+def get_todo_default_hours(todo) -> tuple[time, time]:
     """
-    Get holiday dates for user
+    Working hours assumed for a shiftless assignee by the path that created the
+    ToDo: the full day for Task Assignment rows and Delegation Sheets, default
+    working hours for workflow ToDos
     """
-    holiday_list = None
-    try:
-        emp = frappe.get_all(
-            "Employee",
-            filters={"user_id": user},
-            fields=["holiday_list", "default_shift", "company","name"],
-            limit=1
-        )
-
-        if emp:
-            emp = emp[0]
-            holiday_list = emp.get("holiday_list")
-
-            if not holiday_list and emp.get("default_shift"):
-                holiday_list = frappe.get_value(
-                    "Shift Type",
-                    emp.get("default_shift"),
-                    "holiday_list"
-                )
-
-            if not holiday_list and emp.get("company"):
-                holiday_list = frappe.get_value(
-                    "Company",
-                    emp.get("company"),
-                    "default_holiday_list"
-                )
-
-        if not holiday_list:
-            return []
-
-
-
-        holidays = frappe.get_all(
-            "Holiday",
-            filters={"parent": holiday_list},
-            fields=["holiday_date"]
-        )
-
-        return [
-            getdate(h.holiday_date) for h in holidays
-            if h.holiday_date
-        ]
-
-    except Exception as e:
-        logger.error(
-            f"Error fetching holidays for user {user}: {str(e)}",
-            exc_info=True
-        )
-        return []
+    if todo.get("custom_row_reference") or todo.get("reference_type") == "Delegation Sheet":
+        return FULL_DAY_HOURS
+    return DEFAULT_WORKING_HOURS
 
-def get_user_working_hours(user: str) -> Dict[str, time]:
+def get_todo_calendars(todos: Iterable) -> dict[str, WorkCalendar]:
     """
-    Get user's working hours based on shift
+    Current calendar of each ToDo's assignee, by ToDo name, for ToDos whose
+    stored positions are missing or on a calendar that has since changed
     """
-    try:
-        emp = frappe.get_all(
-            "Employee",
-            filters={"user_id": user},
-            fields=["default_shift"],
-            limit=1
-        )
-
-        if not emp or not emp[0].get("default_shift"):
-            return {}
+    groups: dict[tuple[time, time], list] = {}
+    for todo in todos:
+        groups.setdefault(get_todo_default_hours(todo), []).append(todo)
 
-        shift = frappe.get_doc("Shift Type", emp[0].get("default_shift"))
-        return {
-            "start_time": shift.start_time,
-            "end_time": shift.end_time
-        }
+    calendars = {}
+    for default_hours, group in groups.items():
+        user_calendars = get_user_calendars({todo.allocated_to for todo in group}, default_hours)
+        for todo in group:
+            calendars[todo.name] = user_calendars[todo.allocated_to]
 
-    except Exception as e:
-        logger.error(
-            f"Error fetching working hours for user {user}: {str(e)}",
-            exc_info=True
-        )
-        return {}
+    return calendars
 
 def calculate_expected_end_time(
-    start_time: Union[str, datetime],
+    start_time: str | datetime,
     tat_seconds: int,
-    working_hours_start: Optional[time] = None,
-    working_hours_end: Optional[time] = None,
-    holidays: Optional[List[datetime.date]] = None
-) -> Optional[datetime]:
+    calendar: WorkCalendar
+) -> datetime | None:
     """
-    Calculate expected end time considering working hours and holidays
+    Calculate expected end time on the assignee's working calendar
     """
     try:
         if not tat_seconds or tat_seconds <= 0:
@@ -430,131 +545,11 @@ def calculate_expected_end_time(
         if not isinstance(start_time, datetime):
             return None
 
-        work_start = (
-            working_hours_start
-            if working_hours_start and isinstance(working_hours_start, time)
-            else DEFAULT_WORK_START_TIME
-        )
-        work_end = (
-            working_hours_end
-            if working_hours_end and isinstance(working_hours_end, time)
-            else DEFAULT_WORK_END_TIME
-        )
-
-        if work_end <= work_start:
-            logger.warning(
-                f"Invalid working hours: end {work_end} <= start {work_start}"
-            )
-            work_start = DEFAULT_WORK_START_TIME
-            work_end = DEFAULT_WORK_END_TIME
-
-        current_time = start_time
-        remaining_seconds = tat_seconds
-
-        while remaining_seconds > 0:
-            if holidays and current_time.date() in holidays:
-                current_time = datetime.combine(
-                    current_time.date() + timedelta(days=1),
-                    work_start
-                )
-                continue
-
-            day_start = datetime.combine(current_time.date(), work_start)
-            day_end = datetime.combine(current_time.date(), work_end)
-
-            if current_time < day_start:
-                current_time = day_start
-            elif current_time >= day_end:
-                current_time = datetime.combine(
-                    current_time.date() + timedelta(days=1),
-                    work_start
-                )
-                continue
-
-            remaining_today = (day_end - current_time).total_seconds()
-
-            if remaining_seconds <= remaining_today:
-                return current_time + timedelta(seconds=remaining_seconds)
-            else:
-                remaining_seconds -= remaining_today
-                current_time = datetime.combine(
-                    current_time.date() + timedelta(days=1),
-                    work_start
-                )
-
-        return current_time
+        return calendar_memo.expected_end(calendar, start_time, tat_seconds)
 
     except Exception as e:
         logger.error(
-            f"Error calculating expected end time: {str(e)}",
+            f"Error calculating expected end time: {e!s}",
             exc_info=True
         )
         return None
-
-def calculate_actual_working_time(
-    start_time: Union[str, datetime],
-    end_time: Union[str, datetime],
-    working_hours_start: Optional[time] = None,
-    working_hours_end: Optional[time] = None,
-    holidays: Optional[List[datetime.date]] = None
-) -> float:
-    """
-    Calculate actual working time between two timestamps
-    """
-    try:
-        if isinstance(start_time, str):
-            start_time = get_datetime(start_time)
-        if isinstance(end_time, str):
-            end_time = get_datetime(end_time)
-
-        if not isinstance(start_time, datetime) or not isinstance(end_time, datetime):
-            return 0.0
-
-        if end_time <= start_time:
-            return 0.0
-
-        work_start = (
-            working_hours_start
-            if working_hours_start and isinstance(working_hours_start, time)
-            else DEFAULT_WORK_START_TIME
-        )
-        work_end = (
-            working_hours_end
-            if working_hours_end and isinstance(working_hours_end, time)
-            else DEFAULT_WORK_END_TIME
-        )
-
-        if work_end <= work_start:
-            logger.warning(
-                f"Invalid working hours: end {work_end} <= start {work_start}"
-            )
-            work_start = DEFAULT_WORK_START_TIME
-            work_end = DEFAULT_WORK_END_TIME
-
-        total_seconds = 0.0
-        current_day = start_time.date()
-
-        while current_day <= end_time.date():
-            if holidays and current_day in holidays:
-                current_day += timedelta(days=1)
-                continue
-
-            day_start = datetime.combine(current_day, work_start)
-            day_end = datetime.combine(current_day, work_end)
-
-            period_start = max(start_time, day_start)
-            period_end = min(end_time, day_end)
-
-            if period_start < period_end:
-                total_seconds += (period_end - period_start).total_seconds()
-
-            current_day += timedelta(days=1)
-
-        return total_seconds
-
-    except Exception as e:
-        logger.error(
-            f"Error calculating actual working time: {str(e)}",
-            exc_info=True
-        )
-        return 0.0
@@ -0,0 +1,157 @@
+"""
+Set-based ToDo writes for workflow fan-out.
+
+Inserting ToDos one document at a time runs validation, hooks, an
+Assigned comment and a recount of the reference's assignments per ToDo.
+Here rows are written with one multi-row INSERT. Names are generated up
+front. The reference's _assign is refreshed, one Assigned comment added and
+one list update published per batch. Closing is likewise one UPDATE, with
+per-row values chosen by CASE on the ToDo name.
+"""
+
+import logging
+from collections.abc import Sequence
+from typing import Any
+
+import frappe
+from frappe import _
+from frappe.query_builder import Case
+from frappe.utils import get_fullname, now
+
+logger = logging.getLogger(__name__)
+
+TODO_NAME_LENGTH = 10
+# Standard columns every inserted row gets, in bulk_insert order
+STANDARD_FIELDS = ("name", "owner", "creation", "modified", "modified_by", "docstatus", "idx")
+# ToDos per UPDATE statement, bounding the size of its CASE expressions
+UPDATE_CHUNK_SIZE = 500
+
+
+def insert_todos(
+    rows: Sequence[dict[str, Any]],
+    reference_type: str,
+    reference_name: str,
+    assigned_by: str
+) -> list[str]:
+    """
+    Insert open ToDos on one reference document, without running ToDo
+    controllers. Fields missing from a row are stored as NULL.
+    Returns the names of the new ToDos.
+    """
+    if not rows:
+        return []
+
+    timestamp = now()
+    user = frappe.session.user
+    fields = sorted({field for row in rows for field in row} - {"doctype", *STANDARD_FIELDS})
+    defaults = {
+        "status": "Open",
+        "reference_type": reference_type,
+        "reference_name": reference_name,
+        "assigned_by": assigned_by,
+        "assigned_by_full_name": get_fullname(assigned_by),
+    }
+    fields.extend(field for field in defaults if field not in fields)
+
+    names = []
+    values = []
+    for row in rows:
+        name = frappe.generate_hash(length=TODO_NAME_LENGTH)
+        names.append(name)
+        values.append((
+            name, user, timestamp, timestamp, user, 0, 0,
+            *(row.get(field, defaults.get(field)) for field in fields)
+        ))
+
+    frappe.db.bulk_insert("ToDo", (*STANDARD_FIELDS, *fields), values)
+
+    update_reference(reference_type, reference_name)
+    add_assigned_comment(
+        reference_type, reference_name, assigned_by,
+        [row.get("allocated_to") for row in rows], rows[0].get("description")
+    )
+    frappe.publish_realtime("list_update", {"doctype": "ToDo"}, after_commit=True)
+
+    return names
+
+
+def update_todos(
+    updates: dict[str, dict[str, Any]],
+    reference_type: str,
+    reference_name: str
+) -> None:
+    """
+    Write per-ToDo field values in one UPDATE per chunk, setting modified and
+    modified_by like frappe.db.set_value, then refresh the reference's _assign
+    """
+    if not updates:
+        return
+
+    todo = frappe.qb.DocType("ToDo")
+    timestamp = now()
+    names = list(updates)
+
+    for i in range(0, len(names), UPDATE_CHUNK_SIZE):
+        chunk = names[i:i + UPDATE_CHUNK_SIZE]
+        query = (
+            frappe.qb.update(todo)
+            .set(todo.modified, timestamp)
+            .set(todo.modified_by, frappe.session.user)
+            .where(todo.name.isin(chunk))
+        )
+
+        for field in sorted({field for name in chunk for field in updates[name]}):
+            values = {name: updates[name][field] for name in chunk if field in updates[name]}
+            distinct = set(values.values())
+
+            if len(values) == len(chunk) and len(distinct) == 1:
+                query = query.set(todo[field], distinct.pop())
+                continue
+
+            value = Case()
+            for name, field_value in values.items():
+                value = value.when(todo.name == name, field_value)
+            query = query.set(todo[field], value.else_(todo[field]))
+
+        query.run()
+
+    update_reference(reference_type, reference_name)
+    frappe.publish_realtime("list_update", {"doctype": "ToDo"}, after_commit=True)
+
+
+def update_reference(reference_type: str, reference_name: str) -> None:
+    """
+    Recompute the reference's _assign from its open ToDos, as ToDo.on_update does
+    """
+    frappe.get_doc({
+        "doctype": "ToDo",
+        "reference_type": reference_type,
+        "reference_name": reference_name,
+    }).update_in_reference()
+
+
+def add_assigned_comment(
+    reference_type: str,
+    reference_name: str,
+    assigned_by: str,
+    users: Sequence[str],
+    description: str
+) -> None:
+    """
+    One Assigned comment on the reference for a batch of ToDos
+    """
+    if len(users) == 1:
+        assignees = get_fullname(users[0])
+    else:
+        assignees = _("{0} users").format(len(users))
+
+    frappe.get_doc({
+        "doctype": "Comment",
+        "comment_type": "Assigned",
+        "reference_doctype": reference_type,
+        "reference_name": reference_name,
+        "comment_email": assigned_by,
+        "content": _("{0} assigned {1}: {2}").format(
+            get_fullname(assigned_by), assignees, description or ""
+        ),
+    }).insert(ignore_permissions=True)
@@ -0,0 +1,159 @@
+"""
+Per-user open ToDo load, for single-assignee workflow routing.
+
+Two Redis hashes map each user to the number of their open ToDos and to the
+sum of those ToDos' TAT seconds. FMS's bulk writes adjust them directly, and
+the ToDo doc_events adjust them for ToDos opened or closed anywhere else. An
+hourly job rebuilds both from the ToDo table, to correct any drift.
+
+Deltas are applied after commit, so a rebuild can race them. A delta still
+pending when the rebuild reads the ToDo table is counted twice, and one
+applied between that read and the write is lost. Routing tolerates this
+approximate load until the next rebuild corrects it.
+"""
+
+import logging
+from collections.abc import Iterable, Sequence
+
+import frappe
+from frappe.query_builder.functions import Coalesce, Count, Sum
+
+logger = logging.getLogger(__name__)
+
+OPEN_COUNT_CACHE_KEY = "dt_fms:open_todos"
+OPEN_TAT_CACHE_KEY = "dt_fms:open_tat"
+ROUND_ROBIN_CACHE_KEY = "dt_fms:round_robin"
+# Set by every rebuild, so empty counters are not rebuilt on every read
+OPEN_LOAD_BUILT_CACHE_KEY = "dt_fms:open_load_built"
+# Outlives the hourly rebuild; if that stops running, reads rebuild on demand
+OPEN_LOAD_BUILT_TTL = 2 * 60 * 60
+
+FAN_OUT = "Fan-out"
+ROUND_ROBIN = "Round Robin"
+LEAST_OPEN_TAT = "Least Open TAT"
+
+
+def adjust_open_load(changes: Iterable[tuple[str, int, float]]) -> None:
+    """
+    Add (user, open ToDos, open TAT seconds) deltas to the counters once the
+    transaction commits, in one Redis round trip
+    """
+    changes = [change for change in changes if change[0]]
+    if changes:
+        frappe.db.after_commit.add(lambda: apply_open_load(changes))
+
+
+def apply_open_load(changes: list[tuple[str, int, float]]) -> None:
+    count_key = frappe.cache.make_key(OPEN_COUNT_CACHE_KEY)
+    tat_key = frappe.cache.make_key(OPEN_TAT_CACHE_KEY)
+
+    try:
+        pipe = frappe.cache.pipeline()
+        for user, count, tat in changes:
+            pipe.hincrby(count_key, user, count)
+            pipe.hincrbyfloat(tat_key, user, tat or 0)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to update open ToDo load: {e!s}")
+
+
+def get_open_load(users: Sequence[str]) -> dict[str, tuple[int, float]]:
+    """
+    Open ToDos and open TAT seconds of each user, rebuilt from the database
+    if the counters have not been built recently
+    """
+    if not frappe.cache.exists(OPEN_LOAD_BUILT_CACHE_KEY):
+        rebuild_open_load()
+    count_key = frappe.cache.make_key(OPEN_COUNT_CACHE_KEY)
+
+    pipe = frappe.cache.pipeline()
+    pipe.hmget(count_key, users)
+    pipe.hmget(frappe.cache.make_key(OPEN_TAT_CACHE_KEY), users)
+    counts, tats = pipe.execute()
+
+    return {
+        user: (int(count or 0), float(tat or 0))
+        for user, count, tat in zip(users, counts, tats, strict=True)
+    }
+
+
+def rebuild_open_load() -> None:
+    """
+    Recompute both counters from open ToDos (also run hourly).
+    Approximate while deltas are pending; see the module docstring.
+    """
+    todo = frappe.qb.DocType("ToDo")
+    rows = (
+        frappe.qb.from_(todo)
+        .select(
+            todo.allocated_to,
+            Count("*"),
+            Sum(Coalesce(todo.custom_tat, 0)),
+        )
+        .where((todo.status == "Open") & todo.allocated_to.isnotnull())
+        .groupby(todo.allocated_to)
+        .run()
+    )
+
+    count_key = frappe.cache.make_key(OPEN_COUNT_CACHE_KEY)
+    tat_key = frappe.cache.make_key(OPEN_TAT_CACHE_KEY)
+
+    pipe = frappe.cache.pipeline()
+    pipe.delete(count_key, tat_key)
+    if rows:
+        pipe.hset(count_key, mapping={user: int(count) for user, count, _ in rows})
+        pipe.hset(tat_key, mapping={user: float(tat or 0) for user, _, tat in rows})
+    pipe.set(frappe.cache.make_key(OPEN_LOAD_BUILT_CACHE_KEY), 1, ex=OPEN_LOAD_BUILT_TTL)
+    pipe.execute()
+
+
+def pick_assignee(mode: str, users: list[str], doctype: str, state: str) -> str | None:
+    """
+    The one user to assign under a single-assignee routing mode, None for an
+    unknown mode. users must be in a stable order, as get_users_with_roles
+    returns them.
+    """
+    if not users:
+        return None
+
+    if mode == ROUND_ROBIN:
+        turn = frappe.cache.incr(frappe.cache.make_key(f"{ROUND_ROBIN_CACHE_KEY}:{doctype}:{state}"))
+        return users[(turn - 1) % len(users)]
+
+    if mode == LEAST_OPEN_TAT:
+        load = get_open_load(users)
+        return min(users, key=lambda user: (load[user][1], load[user][0], user))
+
+    logger.warning(f"Unknown routing mode {mode!r} for {doctype} state {state}")
+    return None
+
+
+def on_todo_update(doc, method=None) -> None:
+    """
+    ToDo on_update: move a ToDo's TAT in or out of its user's load when it
+    opens, closes, is reassigned or has its TAT changed
+    """
+    doc_before_save = doc.get_doc_before_save()
+    was_open = bool(doc_before_save) and doc_before_save.status == "Open"
+    is_open = doc.status == "Open"
+
+    if was_open and is_open and (
+        doc_before_save.allocated_to == doc.allocated_to
+        and doc_before_save.custom_tat == doc.custom_tat
+    ):
+        return
+
+    changes = []
+    if was_open:
+        changes.append((doc_before_save.allocated_to, -1, -(doc_before_save.custom_tat or 0)))
+    if is_open:
+        changes.append((doc.allocated_to, 1, doc.custom_tat or 0))
+    adjust_open_load(changes)
+
+
+def on_todo_trash(doc, method=None) -> None:
+    """
+    ToDo on_trash: drop a deleted open ToDo from its user's load
+    """
+    if doc.status == "Open":
+        adjust_open_load([(doc.allocated_to, -1, -(doc.custom_tat or 0))])
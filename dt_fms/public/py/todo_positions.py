@@ -0,0 +1,124 @@
+"""
+Working-second positions stored on FMS ToDos.
+
+Next to its start, expected end and close datetimes, a ToDo keeps their
+positions on the assignee's calendar (working seconds since CALENDAR_EPOCH)
+and the calendar fingerprint. While the calendar is unchanged, time taken and
+delay are plain subtraction, and live delay of open ToDos can be computed in
+SQL from one current position per calendar.
+"""
+
+from collections.abc import Iterable, Sequence
+from datetime import datetime, time
+from typing import Any
+
+from frappe.query_builder import Case
+from frappe.utils import get_datetime
+
+from dt_fms.public.py.user_calendar import FULL_DAY_HOURS, get_user_calendars
+from dt_fms.public.py.work_calendar import WorkCalendar
+from dt_fms.public.py.work_calendar_memo import calendar_memo
+
+CALENDAR_FIELD = "custom_tat_calendar"
+START_POSITION_FIELD = "custom_tat_start_position"
+EXPECTED_END_POSITION_FIELD = "custom_expected_end_position"
+CLOSE_POSITION_FIELD = "custom_tat_close_position"
+
+
+def get_position_fields(
+    calendar: WorkCalendar,
+    start=None,
+    expected_end=None,
+    close=None
+) -> dict[str, Any]:
+    """
+    ToDo field values for the positions of the given datetimes on calendar.
+    Positions of missing datetimes are left out.
+    """
+    fields = {CALENDAR_FIELD: calendar.fingerprint}
+
+    for fieldname, value in (
+        (START_POSITION_FIELD, start),
+        (EXPECTED_END_POSITION_FIELD, expected_end),
+        (CLOSE_POSITION_FIELD, close),
+    ):
+        if value:
+            fields[fieldname] = calendar.position(get_datetime(value))
+
+    return fields
+
+
+def position_delta(start: float | None, end: float | None) -> int:
+    """
+    Working seconds between two positions, 0 if either is missing
+    """
+    if start is None or end is None:
+        return 0
+    return int(max(end - start, 0))
+
+
+def has_positions(todo, calendar: WorkCalendar) -> bool:
+    """
+    Whether a ToDo has a start position and it is on this calendar
+    """
+    return bool(todo.get("custom_tat_start_time")) and todo.get(CALENDAR_FIELD) == calendar.fingerprint
+
+
+def get_time_taken(
+    todo,
+    calendar: WorkCalendar,
+    close_time: datetime,
+    close_position: float | None = None
+) -> float:
+    """
+    Working seconds from a ToDo's start to close_time.
+    Subtraction when the ToDo's positions are on this calendar, a calendar
+    lookup for older ToDos or after the calendar changed.
+    """
+    if close_position is None:
+        close_position = calendar.position(close_time)
+
+    if has_positions(todo, calendar):
+        return max(close_position - todo.get(START_POSITION_FIELD), 0)
+
+    if not todo.get("custom_tat_start_time"):
+        return 0.0
+    return calendar_memo.working_seconds(calendar, get_datetime(todo.custom_tat_start_time), close_time)
+
+
+def get_current_positions(
+    users: Iterable[str],
+    hours: Sequence[tuple[time, time]] = (FULL_DAY_HOURS,),
+    at: datetime | None = None
+) -> dict[str, float]:
+    """
+    Map the fingerprint of every calendar the users' ToDos may be on to the
+    position of `at` (now by default) on that calendar
+    """
+    at = get_datetime(at)
+    users = set(users)
+
+    positions = {}
+    for default_hours in hours:
+        for calendar in get_user_calendars(users, default_hours).values():
+            if calendar.fingerprint not in positions:
+                positions[calendar.fingerprint] = calendar.position(at)
+
+    return positions
+
+
+def live_delay(todo_table, positions: dict[str, float]):
+    """
+    Query builder term for the current delay of open ToDos, in working seconds.
+    NULL for ToDos whose calendar is not in positions, which must not be empty.
+    """
+    calendar = todo_table[CALENDAR_FIELD]
+    expected_end = todo_table[EXPECTED_END_POSITION_FIELD]
+
+    delay = Case()
+    for fingerprint, position in positions.items():
+        delay = delay.when(
+            (calendar == fingerprint) & (expected_end < position), position - expected_end
+        ).when(calendar == fingerprint, 0)
+
+    return delay
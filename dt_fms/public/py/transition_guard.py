@@ -0,0 +1,116 @@
+"""
+Idempotency and locking for workflow transition processing.
+
+A transition is identified by (doctype, name, from_state, to_state,
+modified). Before any query runs, the processor claims it. The claim is
+refused only if the key was already processed. Otherwise the processor takes
+the document's lock (SET NX EX). On commit the key is recorded with a TTL and
+the lock released. On rollback only the lock is released, so a retry can
+process the transition again.
+
+A held lock can be a double submit of the same transition. It can also be
+another worker processing a different transition of the document, such as a
+deferred sync of an earlier save. The claim runs inside the save's commit,
+with its row locks held, so it never waits: the transition is queued for a
+background retry instead of being dropped. Only the retry job backs off,
+before it reads the document again.
+"""
+
+import logging
+
+import frappe
+
+logger = logging.getLogger(__name__)
+
+TRANSITION_CACHE_KEY = "dt_fms:transition"
+TRANSITION_LOCK_CACHE_KEY = "dt_fms:transition_lock"
+# How long a processed transition is remembered
+TRANSITION_KEY_TTL = 24 * 60 * 60
+# Upper bound on how long a crashed worker can hold a document
+TRANSITION_LOCK_TIMEOUT = 120
+# Background retries of one transition before it is given up
+MAX_TRANSITION_RETRIES = 3
+# Retry n waits n times this long before it reads the document
+RETRY_BACKOFF_SECONDS = 5
+RETRY_TRANSITION_METHOD = "dt_fms.public.py.todo_assignment.retry_workflow_state_change"
+
+# Delete the lock only if it still holds this worker's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def get_transition_key(doc, from_state: str | None) -> str:
+    return (
+        f"{TRANSITION_CACHE_KEY}:{doc.doctype}:{doc.name}:{from_state or ''}:"
+        f"{doc.get('workflow_state') or ''}:{doc.modified}"
+    )
+
+
+def get_lock_key(doc) -> str:
+    return f"{TRANSITION_LOCK_CACHE_KEY}:{doc.doctype}:{doc.name}"
+
+
+def claim_transition(doc, from_state: str | None, attempt: int = 0) -> bool:
+    """
+    Whether the current transaction should process this transition of doc.
+    A successful claim is settled when the transaction commits or rolls back.
+    False if the transition was already processed, or if it was queued for
+    a retry because the document stayed locked.
+    """
+    key = get_transition_key(doc, from_state)
+    # exists() prefixes keys itself; the raw commands below need the site prefix
+    stored_key = frappe.cache.make_key(key)
+    lock = frappe.cache.make_key(get_lock_key(doc))
+    token = frappe.generate_hash()
+
+    try:
+        if frappe.cache.exists(key):
+            logger.info(f"Transition already processed: {key}")
+            return False
+
+        if not frappe.cache.set(lock, token, nx=True, ex=TRANSITION_LOCK_TIMEOUT):
+            enqueue_retry(doc, from_state, attempt)
+            return False
+    except Exception as e:
+        # Without Redis there is nothing to dedupe against; process as before
+        logger.warning(f"Failed to claim transition {key}: {e!s}")
+        return True
+
+    def release():
+        frappe.cache.eval(RELEASE_LOCK_SCRIPT, 1, lock, token)
+
+    def settle():
+        frappe.cache.set(stored_key, 1, ex=TRANSITION_KEY_TTL)
+        release()
+
+    frappe.db.after_commit.add(settle)
+    frappe.db.after_rollback.add(release)
+    return True
+
+
+def enqueue_retry(doc, from_state: str | None, attempt: int) -> None:
+    """
+    Queue the transition to be processed again once the current transaction
+    commits, when another worker holds the document
+    """
+    key = get_transition_key(doc, from_state)
+    if attempt >= MAX_TRANSITION_RETRIES:
+        logger.warning(f"Giving up transition still locked after {attempt} retries: {key}")
+        return
+
+    logger.info(f"Transition locked elsewhere, queueing retry {attempt + 1}: {key}")
+    frappe.enqueue(
+        RETRY_TRANSITION_METHOD,
+        queue="default",
+        enqueue_after_commit=True,
+        doctype=doc.doctype,
+        docname=doc.name,
+        previous_state=from_state,
+        workflow_state=doc.get("workflow_state"),
+        modified=str(doc.modified),
+        attempt=attempt + 1,
+    )
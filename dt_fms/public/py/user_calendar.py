@@ -0,0 +1,258 @@
+import logging
+from collections.abc import Iterable
+from datetime import date, time
+from zoneinfo import ZoneInfo
+
+import frappe
+from frappe.utils import get_datetime, get_system_timezone, getdate
+from frappe.utils.caching import request_cache
+
+from dt_fms.public.py.fms_trace import trace, tracing
+from dt_fms.public.py.work_calendar import HolidaySet, WorkCalendar, to_time
+from dt_fms.public.py.work_calendar_memo import calendar_memo
+
+logger = logging.getLogger(__name__)
+
+# Shift window used for TAT when the assignee has no shift
+FULL_DAY_START_TIME = time(0, 0, 0)
+FULL_DAY_END_TIME = time(23, 59, 59)
+FULL_DAY_HOURS = (FULL_DAY_START_TIME, FULL_DAY_END_TIME)
+
+HOLIDAY_CACHE_KEY = "dt_fms:holiday_sets"
+
+# Origin of calendar positions stored on ToDos; changing it invalidates them
+CALENDAR_EPOCH = date(2020, 1, 1)
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def get_tat(start, end, assigned_to) -> int:
+    """
+    Calculate the Turnaround Time (TAT) in seconds, considering shift timings and holidays.
+    Naive values are system-timezone wall times; aware values are converted by the calendar.
+    """
+    if not start or not end:
+        return 0
+
+    calendar = get_user_calendar(assigned_to)
+    tat = int(calendar_memo.working_seconds(calendar, get_datetime(start), get_datetime(end)))
+
+    if tracing():
+        trace(
+            "TAT for %s from %s to %s: %ss (hours %s-%s, %s holidays, calendar %s)",
+            assigned_to, start, end, tat, calendar.work_start, calendar.work_end,
+            len(calendar.holidays), calendar.fingerprint
+        )
+    return tat
+
+
+@request_cache
+def get_site_timezone() -> ZoneInfo:
+    """
+    Get the system timezone, resolved once per request
+    """
+    return ZoneInfo(get_system_timezone())
+
+
+def get_user_calendar(user: str, default_hours: tuple[time, time] = FULL_DAY_HOURS) -> WorkCalendar:
+    """
+    Get the shared working calendar for a user
+    """
+    return get_user_calendars([user], default_hours)[user]
+
+
+def get_user_calendars(
+    users: Iterable[str],
+    default_hours: tuple[time, time] = FULL_DAY_HOURS
+) -> dict[str, WorkCalendar]:
+    """
+    Map users to working calendars. Users with the same shift and holiday list
+    share one calendar instance, so callers can group work per calendar.
+    """
+    users = set(users)
+    resolved = resolve_users(users)
+
+    calendars = {}
+    for user in users:
+        info = resolved.get(user)
+        if info:
+            calendars[user] = get_calendar(info.shift, info.holiday_list, default_hours)
+        else:
+            calendars[user] = get_calendar(None, None, default_hours)
+
+    return calendars
+
+
+def get_calendar_key(user: str) -> tuple[str | None, str | None]:
+    """
+    Get the (shift, holiday list) pair a user's working calendar is built from
+    """
+    info = resolve_users([user]).get(user)
+    if not info:
+        return None, None
+    return info.shift, info.holiday_list
+
+
+def resolve_users(users: Iterable[str]) -> dict[str, frappe._dict]:
+    """
+    Resolve users to their employee, shift timings and effective holiday list.
+    The holiday list falls back to the shift's and then the company's list.
+
+    Costs one joined query for all users; company holiday lists come from the
+    document cache. Users without an Employee record are left out.
+    """
+    users = list(set(users))
+    if not users:
+        return {}
+
+    Employee = frappe.qb.DocType("Employee")
+    ShiftType = frappe.qb.DocType("Shift Type")
+
+    rows = (
+        frappe.qb.from_(Employee)
+        .left_join(ShiftType).on(ShiftType.name == Employee.default_shift)
+        .select(
+            Employee.user_id,
+            Employee.name.as_("employee"),
+            Employee.default_shift,
+            Employee.holiday_list,
+            Employee.company,
+            ShiftType.start_time,
+            ShiftType.end_time,
+            ShiftType.holiday_list.as_("shift_holiday_list"),
+        )
+        .where(Employee.user_id.isin(users))
+    ).run(as_dict=True)
+
+    resolved = {}
+    for row in rows:
+        if row.user_id in resolved:
+            continue
+
+        holiday_list = row.holiday_list or row.shift_holiday_list
+        if not holiday_list and row.company:
+            holiday_list = frappe.get_cached_value("Company", row.company, "default_holiday_list")
+
+        resolved[row.user_id] = frappe._dict(
+            employee=row.employee,
+            shift=row.default_shift,
+            start_time=to_time(row.start_time),
+            end_time=to_time(row.end_time),
+            holiday_list=holiday_list,
+        )
+
+    return resolved
+
+
+@request_cache
+def get_calendar(
+    shift: str | None = None,
+    holiday_list: str | None = None,
+    default_hours: tuple[time, time] = FULL_DAY_HOURS
+) -> WorkCalendar:
+    """
+    Build the working calendar for a shift and holiday list.
+    Resolved once per distinct key per request; equal calendars share one
+    instance per process. Positions are counted from CALENDAR_EPOCH.
+    """
+    work_start, work_end = default_hours
+    intervals = None
+
+    shift_type = get_shift_type(shift)
+    if shift_type:
+        work_start = to_time(shift_type.start_time) or work_start
+        work_end = to_time(shift_type.end_time) or work_end
+        intervals = get_shift_intervals(shift_type)
+
+    holidays = get_holidays(holiday_list)
+    try:
+        calendar = WorkCalendar(
+            work_start, work_end, holidays, CALENDAR_EPOCH, get_site_timezone(), intervals
+        )
+    except ValueError as e:
+        logger.warning(f"Invalid working hours for shift {shift}: {e!s}")
+        calendar = WorkCalendar(*default_hours, holidays, CALENDAR_EPOCH, get_site_timezone())
+
+    calendar_memo.register((shift, holiday_list, default_hours), calendar.fingerprint)
+    return calendar_memo.shared(calendar)
+
+
+def get_shift_type(shift: str | None):
+    """
+    Get a Shift Type from the document cache, or None if it does not exist
+    """
+    if not shift:
+        return None
+
+    try:
+        return frappe.get_cached_doc("Shift Type", shift)
+    except frappe.DoesNotExistError:
+        frappe.clear_last_message()
+        return None
+
+
+def get_shift_intervals(shift_type) -> dict[int, list[tuple[time, time]]] | None:
+    """
+    Map weekdays (0 = Monday) to the working intervals of a Shift Type.
+    Rows without a weekday apply to every weekday that has no rows of its own.
+    Returns None when the shift only has a start and end time.
+    """
+    rows = shift_type.get("custom_working_intervals") or []
+    if not rows:
+        return None
+
+    every_day = [(row.start_time, row.end_time) for row in rows if not row.weekday]
+    return {
+        weekday: [(row.start_time, row.end_time) for row in rows if row.weekday == day_name] or every_day
+        for weekday, day_name in enumerate(WEEKDAYS)
+    }
+
+
+def get_holidays(holiday_list: str | None) -> HolidaySet:
+    """
+    Get holidays of a holiday list as a weekly-off mask plus exception dates.
+    Cached site-wide in that compact form until the Holiday List changes.
+    """
+    if not holiday_list:
+        return HolidaySet()
+
+    cached = frappe.cache.hget(HOLIDAY_CACHE_KEY, holiday_list)
+    if cached is not None:
+        return HolidaySet.from_dict(cached)
+
+    holiday_dates = frappe.get_all(
+        "Holiday",
+        filters={"parent": holiday_list},
+        pluck="holiday_date"
+    )
+    from_date, to_date = frappe.db.get_value(
+        "Holiday List", holiday_list, ["from_date", "to_date"]
+    ) or (None, None)
+
+    holidays = HolidaySet.from_dates(
+        {getdate(d) for d in holiday_dates if d},
+        getdate(from_date) if from_date else None,
+        getdate(to_date) if to_date else None,
+    )
+    frappe.cache.hset(HOLIDAY_CACHE_KEY, holiday_list, holidays.to_dict())
+    return holidays
+
+
+def clear_holiday_cache(doc, method=None) -> None:
+    """
+    Drop cached holidays of a Holiday List when it is updated or deleted,
+    again once the change is committed so holidays re-cached in between
+    from the old rows do not outlive it
+    """
+    holiday_list = doc.name
+    frappe.cache.hdel(HOLIDAY_CACHE_KEY, holiday_list)
+    frappe.db.after_commit.add(lambda: frappe.cache.hdel(HOLIDAY_CACHE_KEY, holiday_list))
+
+
+@frappe.whitelist()
+def get_calendar_memo_stats() -> dict[str, float]:
+    """
+    Hit-rate counters of this worker's calendar memo
+    """
+    frappe.only_for("System Manager")
+    return calendar_memo.stats()
@@ -1,12 +1,88 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import NamedTuple
+
 import frappe
+
+FMS_SETTINGS_CACHE_KEY = "dt_fms:settings"
+
+
+class FMSSettingsSnapshot(NamedTuple):
+    """Immutable view of the FMS Settings that every save checks"""
+    enabled: bool
+    doctypes: frozenset[str]
+    # Active doctypes whose sync runs in a background job after commit
+    deferred: frozenset[str] = frozenset()
+
+
+def get_fms_settings() -> FMSSettingsSnapshot:
+    """
+    Get the FMS Settings snapshot.
+    Kept in request-local memory and in Redis; built from the database only
+    when neither has it, and rebuilt by FMSSettings.on_update.
+    """
+    snapshot = getattr(frappe.local, "fms_settings", None)
+    if snapshot is not None:
+        return snapshot
+
+    cached = frappe.cache.get_value(FMS_SETTINGS_CACHE_KEY)
+    if cached is None:
+        cached = build_fms_settings(frappe.get_single("FMS Settings"))
+        frappe.cache.set_value(FMS_SETTINGS_CACHE_KEY, cached)
+
+    snapshot = frappe.local.fms_settings = FMSSettingsSnapshot(
+        bool(cached["enabled"]), frozenset(cached["doctypes"]), frozenset(cached.get("deferred", ()))
+    )
+    return snapshot
+
+
+def build_fms_settings(settings) -> dict:
+    """
+    Cacheable form of an FMS Settings document
+    """
+    rows = [row for row in settings.doctypes_to_apply_on if row.active and row.doctype_]
+    return {
+        "enabled": bool(settings.enable),
+        "doctypes": sorted({row.doctype_ for row in rows}),
+        "deferred": sorted({row.doctype_ for row in rows if row.processing == "Deferred"}),
+    }
+
+
+def refresh_fms_settings(settings) -> None:
+    """
+    Replace the cached snapshot with one built from the saved settings,
+    once the save is committed
+    """
+    cached = build_fms_settings(settings)
+    frappe.db.after_commit.add(lambda: frappe.cache.set_value(FMS_SETTINGS_CACHE_KEY, cached))
+    frappe.local.fms_settings = None
+
+
+@contextmanager
+def fms_writes() -> Iterator[None]:
+    """
+    Mark documents saved inside the block as FMS's own records, so the
+    "*" doc_events skip them. Nests; the flag is request-local.
+    """
+    depth = frappe.flags.fms_write_depth or 0
+    frappe.flags.fms_write_depth = depth + 1
+    try:
+        yield
+    finally:
+        frappe.flags.fms_write_depth = depth
+
+
+def in_fms_write() -> bool:
+    """
+    Whether FMS is currently writing its own records
+    """
+    return bool(frappe.flags.fms_write_depth)
+
+
 def is_fms_enable():
     """Check if FMS is enabled"""
-    return frappe.db.get_value("FMS Settings", "FMS Settings", "enable")
+    return get_fms_settings().enabled
 
 def is_applied_on_doctype(doc):
     """Check if workflow automation is applied on the given doctype"""
-    return frappe.db.exists("FMS Settings Doctypes", {
-        "parent": "FMS Settings",
-        "doctype_": doc.doctype,
-        "active": 1
-    })
+    return doc.doctype in get_fms_settings().doctypes
@@ -0,0 +1,555 @@
+"""
+Working-calendar arithmetic used for TAT calculations.
+
+A WorkCalendar compiles its working intervals into a cumulative index of
+working seconds, so an expected end time is a bisect over that index and
+elapsed working time is two lookups and a subtraction, instead of a
+day-by-day walk. Days with breaks or split shifts just add segments to the
+same index.
+
+Calendars can carry a timezone. UTC offsets are precomputed per indexed date,
+so positions are real elapsed seconds even on DST transition days, without a
+localize call per day or per lookup.
+
+This module has no Frappe dependency.
+"""
+
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Mapping
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import NamedTuple
+
+SECONDS_PER_DAY = 24 * 60 * 60
+WINDOW_CHUNK_DAYS = 64  # minimum number of dates added when the window grows
+
+MIN_WEEKLY_OFFS = 4  # dates of a weekday needed before it can be masked as a weekly off
+
+TimeValue = time | timedelta | str
+
+
+def to_time(val) -> time | None:
+    """
+    Coerce a Time field value (time, timedelta or "HH:MM:SS" string) to datetime.time
+    """
+    if isinstance(val, time):
+        return val
+
+    if isinstance(val, timedelta):
+        total_seconds = int(val.total_seconds()) % SECONDS_PER_DAY
+        return time(total_seconds // 3600, (total_seconds % 3600) // 60, total_seconds % 60)
+
+    if isinstance(val, str) and val:
+        try:
+            parts = [int(float(p)) for p in val.split(":")]
+        except ValueError:
+            return None
+        parts += [0] * (3 - len(parts))
+        return to_time(timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2]))
+
+    return None
+
+
+def seconds_of_day(value: time | datetime) -> float:
+    """Seconds elapsed since midnight for a time or datetime"""
+    seconds = value.hour * 3600 + value.minute * 60 + value.second
+    if value.microsecond:
+        return seconds + value.microsecond / 1_000_000
+    return seconds
+
+
+def merge_intervals(intervals: Iterable[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Sort intervals and merge the ones that overlap or touch, dropping empty ones"""
+    merged: list[tuple[float, float]] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class HolidaySet:
+    """
+    Holidays stored as a weekly-off mask plus exception dates.
+
+    Bit w of weekly_mask marks weekday w (0 = Monday) as off for the dates with
+    ordinals first..last. extra holds holidays outside that pattern and
+    workdays the masked dates that are working days, so membership is a bit
+    test plus at most one lookup in a short set.
+    """
+
+    __slots__ = ("extra", "first", "last", "weekly_mask", "workdays")
+
+    def __init__(
+        self,
+        weekly_mask: int = 0,
+        first: int = 0,
+        last: int = -1,
+        extra: Iterable[int] = (),
+        workdays: Iterable[int] = ()
+    ):
+        self.weekly_mask = weekly_mask
+        self.first = first
+        self.last = last
+        self.extra = frozenset(extra)
+        self.workdays = frozenset(workdays)
+
+    @classmethod
+    def from_dates(
+        cls,
+        dates: Iterable[date],
+        first: date | None = None,
+        last: date | None = None
+    ) -> "HolidaySet":
+        """
+        Detect weekly offs in a list of holiday dates.
+        A weekday is masked when most of its dates between first and last are
+        holidays; first and last default to the earliest and latest holiday.
+        """
+        ordinals = {d.toordinal() for d in dates}
+        if not ordinals:
+            return cls()
+
+        first_ordinal = first.toordinal() if first else min(ordinals)
+        last_ordinal = last.toordinal() if last else max(ordinals)
+
+        weekly_mask = 0
+        workdays = []
+        for weekday in range(7):
+            days = range(first_ordinal + (weekday - first_ordinal + 1) % 7, last_ordinal + 1, 7)
+            working = [o for o in days if o not in ordinals]
+            if len(days) >= MIN_WEEKLY_OFFS and len(working) * 2 < len(days):
+                weekly_mask |= 1 << weekday
+                workdays.extend(working)
+
+        holidays = cls(weekly_mask, first_ordinal, last_ordinal, workdays=workdays)
+        holidays.extra = frozenset(o for o in ordinals if not holidays._masked(o))
+        return holidays
+
+    @classmethod
+    def from_dict(cls, value: dict) -> "HolidaySet":
+        return cls(**value)
+
+    def to_dict(self) -> dict:
+        """Plain form for caching"""
+        return {
+            "weekly_mask": self.weekly_mask,
+            "first": self.first,
+            "last": self.last,
+            "extra": sorted(self.extra),
+            "workdays": sorted(self.workdays),
+        }
+
+    def key(self) -> tuple:
+        return (self.weekly_mask, self.first, self.last, tuple(sorted(self.extra)), tuple(sorted(self.workdays)))
+
+    def contains_ordinal(self, ordinal: int) -> bool:
+        if self._masked(ordinal):
+            return ordinal not in self.workdays
+        return ordinal in self.extra
+
+    def _masked(self, ordinal: int) -> bool:
+        return self.first <= ordinal <= self.last and self.weekly_mask >> ((ordinal - 1) % 7) & 1
+
+    def __contains__(self, value: date) -> bool:
+        return self.contains_ordinal(value.toordinal())
+
+    def __iter__(self) -> Iterator[date]:
+        ordinals = set(self.extra)
+        if self.weekly_mask:
+            ordinals.update(
+                o for o in range(self.first, self.last + 1)
+                if self.weekly_mask >> ((o - 1) % 7) & 1 and o not in self.workdays
+            )
+        return (date.fromordinal(o) for o in sorted(ordinals))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return bool(self.weekly_mask or self.extra)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, HolidaySet) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __repr__(self) -> str:
+        return (
+            f"HolidaySet(weekly_mask={self.weekly_mask:07b}, first={self.first}, last={self.last}, "
+            f"{len(self.extra)} extra, {len(self.workdays)} workdays)"
+        )
+
+
+class CalendarIndex(NamedTuple):
+    """
+    Snapshot of a calendar's compiled arrays.
+
+    Per date, for the date with ordinal first + i: cum[i] is the position at
+    its midnight, offsets[i] the UTC offset in seconds at its midnight, and its
+    working intervals are the segments day_segments[i]..day_segments[i + 1].
+    These three have one extra trailing entry.
+
+    Per segment j: seg_ordinals[j] is its date, seg_starts[j] and seg_ends[j]
+    the real seconds from that date's midnight, and seg_cum[j] the position at
+    its start.
+
+    A snapshot is never modified: growing the window builds a new one and
+    swaps it in with a single assignment, so concurrent readers of a shared
+    calendar always see matching arrays.
+    """
+    first: int
+    cum: list[float]
+    offsets: list[float]
+    day_segments: list[int]
+    seg_ordinals: list[int]
+    seg_starts: list[float]
+    seg_ends: list[float]
+    seg_cum: list[float]
+
+
+class WorkCalendar:
+    """
+    Cumulative working-seconds index for per-weekday working intervals and a set of holidays.
+
+    The working week is either one daily window (work_start - work_end) or a
+    mapping of weekday (0 = Monday) to (start, end) intervals, which allows
+    breaks and split shifts. An interval ending at or before its start runs
+    overnight into the next date and belongs to the date it starts on, so a
+    holiday cancels the whole shift.
+
+    Positions are working seconds counted from midnight of the calendar origin.
+    The window of indexed dates grows on demand in either direction, and
+    positions already handed out never change when it does.
+
+    Naive datetimes are wall-clock times in the calendar timezone; aware ones
+    are converted to it. Without a timezone every day is exactly 24 hours long.
+
+    Instances are safe to share between threads: lookups read one index
+    snapshot, and the window grows under a lock.
+    """
+
+    def __init__(
+        self,
+        work_start: TimeValue | None = None,
+        work_end: TimeValue | None = None,
+        holidays: HolidaySet | Iterable[date] | None = None,
+        origin: date | None = None,
+        tz: tzinfo | None = None,
+        intervals: Mapping[int, Iterable[tuple[TimeValue, TimeValue]]] | None = None,
+    ):
+        self.work_start = to_time(work_start)
+        self.work_end = to_time(work_end)
+
+        if intervals is None:
+            intervals = {weekday: [(work_start, work_end)] for weekday in range(7)}
+
+        self.tz = tz
+        self.origin = origin
+        if not isinstance(holidays, HolidaySet):
+            holidays = HolidaySet.from_dates(holidays or ())
+        self.holidays = holidays
+        self._week = self._compile_week(intervals)
+
+        # Wall-clock intervals per weekday on their own date and spilled past midnight
+        self._own = [
+            [(start, min(end, SECONDS_PER_DAY)) for start, end in self._week[weekday]]
+            for weekday in range(7)
+        ]
+        self._spill = [
+            [(0, end - SECONDS_PER_DAY) for _, end in self._week[weekday] if end > SECONDS_PER_DAY]
+            for weekday in range(7)
+        ]
+        self._days = [
+            merge_intervals(self._own[weekday] + self._spill[(weekday - 1) % 7])
+            for weekday in range(7)
+        ]
+
+        self._fingerprint: str | None = None
+        self._index: CalendarIndex | None = None
+        self._grow_lock = threading.Lock()
+
+        if origin is not None:
+            self._index = self._initial_index(origin.toordinal())
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of everything results depend on: working intervals, holidays and timezone.
+        Equal for calendars that give the same working times and end times.
+        """
+        if self._fingerprint is None:
+            source = repr((
+                self._week,
+                self.holidays.key(),
+                str(self.tz) if self.tz is not None else None,
+            ))
+            self._fingerprint = hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+        return self._fingerprint
+
+    def position(self, value: datetime) -> float:
+        """
+        Working seconds between the calendar origin and the given datetime
+        """
+        ordinal, elapsed, index = self._locate(value)
+
+        day = ordinal - index.first
+        low = index.day_segments[day]
+        segment = bisect_right(index.seg_starts, elapsed, low, index.day_segments[day + 1]) - 1
+
+        if segment < low:
+            return index.cum[day]
+
+        start = index.seg_starts[segment]
+        return index.seg_cum[segment] + min(elapsed - start, index.seg_ends[segment] - start)
+
+    def datetime_at(self, position: float, aware: bool = False) -> datetime:
+        """
+        Earliest datetime at which the given position is reached.
+        Returns a naive wall-clock time unless aware is set.
+        """
+        index = self._ensure_positions(position, position)
+
+        segment = bisect_left(index.seg_cum, position) - 1
+        elapsed = index.seg_starts[segment] + position - index.seg_cum[segment]
+        return self._from_elapsed(index, index.seg_ordinals[segment], elapsed, aware)
+
+    def working_seconds(self, start: datetime, end: datetime) -> float:
+        """
+        Working seconds elapsed between two datetimes
+        """
+        return max(self.position(end) - self.position(start), 0)
+
+    def expected_end(self, start: datetime, tat_seconds: float) -> datetime:
+        """
+        Datetime at which tat_seconds of working time have elapsed after start.
+        Aware if start is aware, naive wall-clock time otherwise.
+        """
+        return self.datetime_at(self.position(start) + tat_seconds, aware=start.tzinfo is not None)
+
+    @staticmethod
+    def _compile_week(
+        intervals: Mapping[int, Iterable[tuple[TimeValue, TimeValue]]]
+    ) -> tuple[tuple[tuple[float, float], ...], ...]:
+        """Wall-clock (start, end) seconds per weekday; overnight ends run past SECONDS_PER_DAY"""
+        week = []
+        for weekday in range(7):
+            pairs = []
+            for start, end in intervals.get(weekday, ()):
+                start_time, end_time = to_time(start), to_time(end)
+                if start_time is None or end_time is None or start_time == end_time:
+                    raise ValueError(f"Invalid working hours: {start} - {end}")
+
+                start_seconds = seconds_of_day(start_time)
+                end_seconds = seconds_of_day(end_time)
+                if end_seconds < start_seconds:
+                    end_seconds += SECONDS_PER_DAY
+                pairs.append((start_seconds, end_seconds))
+
+            week.append(tuple(merge_intervals(pairs)))
+
+        if not any(week):
+            raise ValueError("Working calendar has no working intervals")
+        return tuple(week)
+
+    def _locate(self, value: datetime) -> tuple[int, float, CalendarIndex]:
+        """
+        Local date ordinal of a datetime, the real seconds elapsed since that
+        date's midnight, and an index snapshot covering that date
+        """
+        if value.tzinfo is not None:
+            if self.tz is None:
+                value = value.replace(tzinfo=None)
+            else:
+                value = value.astimezone(self.tz)
+
+        ordinal = value.toordinal()
+        index = self._ensure(ordinal, ordinal)
+
+        day = ordinal - index.first
+        midnight_offset = index.offsets[day]
+
+        if value.tzinfo is not None:
+            offset = value.utcoffset().total_seconds()
+        elif midnight_offset == index.offsets[day + 1]:
+            offset = midnight_offset
+        else:
+            # DST transition day
+            offset = self._utcoffset(value)
+
+        return ordinal, seconds_of_day(value) - offset + midnight_offset, index
+
+    def _from_elapsed(self, index: CalendarIndex, ordinal: int, elapsed: float, aware: bool) -> datetime:
+        """Inverse of _locate"""
+        day = ordinal - index.first
+        midnight_offset = index.offsets[day]
+
+        if not aware and midnight_offset == index.offsets[day + 1]:
+            return datetime.fromordinal(ordinal) + timedelta(seconds=elapsed)
+
+        utc = datetime.fromordinal(ordinal) + timedelta(seconds=elapsed - midnight_offset)
+        if self.tz is None:
+            return utc
+
+        value = utc.replace(tzinfo=timezone.utc).astimezone(self.tz)
+        return value if aware else value.replace(tzinfo=None)
+
+    def _utcoffset(self, wall: datetime) -> float:
+        if self.tz is None:
+            return 0
+        return self.tz.utcoffset(wall).total_seconds()
+
+    def _wall_intervals(self, ordinal: int) -> list[tuple[float, float]]:
+        """Working intervals of a date in wall-clock seconds from its midnight"""
+        weekday = (ordinal - 1) % 7
+        holiday = self.holidays.contains_ordinal(ordinal)
+        after_holiday = self.holidays.contains_ordinal(ordinal - 1)
+
+        if not holiday and not after_holiday:
+            return self._days[weekday]
+
+        own = [] if holiday else self._own[weekday]
+        spill = [] if after_holiday else self._spill[(weekday - 1) % 7]
+        return merge_intervals(own + spill)
+
+    def _day(self, ordinal: int, midnight_offset: float, next_midnight_offset: float) -> list[tuple[float, float]]:
+        """Working intervals of a date in real seconds from its midnight"""
+        intervals = self._wall_intervals(ordinal)
+        if midnight_offset == next_midnight_offset:
+            return intervals
+
+        day = datetime.fromordinal(ordinal)
+        real = []
+        for start, end in intervals:
+            start = start - self._utcoffset(day + timedelta(seconds=start)) + midnight_offset
+            end = end - self._utcoffset(day + timedelta(seconds=end)) + midnight_offset
+            if end > start:
+                real.append((start, end))
+        return real
+
+    def _initial_index(self, ordinal: int) -> CalendarIndex:
+        """Empty index whose window starts at the given date"""
+        return CalendarIndex(
+            ordinal, [0], [self._utcoffset(datetime.fromordinal(ordinal))], [0], [], [], [], []
+        )
+
+    def _ensure(self, first: int, last: int) -> CalendarIndex:
+        """Index snapshot in which dates first..last (ordinals, inclusive) are indexed"""
+        index = self._index
+        if index is not None and index.first <= first and last < index.first + len(index.cum) - 1:
+            return index
+
+        with self._grow_lock:
+            index = self._index
+            if index is None:
+                index = self._initial_index(first)
+
+            if first < index.first:
+                index = self._extend_back(index, max(index.first - first, WINDOW_CHUNK_DAYS))
+
+            missing = last + 1 - (index.first + len(index.cum) - 1)
+            if missing > 0:
+                index = self._extend_forward(index, max(missing, WINDOW_CHUNK_DAYS))
+
+            self._index = index
+            return index
+
+    def _ensure_positions(self, high: float, low: float | None = None) -> CalendarIndex:
+        """Index snapshot that reaches high and, if given, starts below low"""
+        index = self._index
+        if index is None:
+            raise ValueError("Calendar has no origin yet")
+
+        if high <= index.cum[-1] and (low is None or low > index.cum[0]):
+            return index
+
+        with self._grow_lock:
+            index = self._index
+
+            while high > index.cum[-1]:
+                index = self._extend_forward(index, max(len(index.cum), WINDOW_CHUNK_DAYS))
+
+            while low is not None and low <= index.cum[0]:
+                index = self._extend_back(index, max(len(index.cum), WINDOW_CHUNK_DAYS))
+
+            self._index = index
+            return index
+
+    def _compile_days(
+        self, ordinals: range, offsets: list[float], position: float
+    ) -> tuple[list[float], list[int], list[int], list[float], list[float], list[float]]:
+        """
+        Per-date positions and segments for consecutive dates starting at position.
+        offsets has one entry per date plus the next date's; segment numbers are
+        relative to the first date.
+        """
+        cum, day_segments = [], []
+        seg_ordinals, seg_starts, seg_ends, seg_cum = [], [], [], []
+
+        for i, ordinal in enumerate(ordinals):
+            cum.append(position)
+            day_segments.append(len(seg_starts))
+            for start, end in self._day(ordinal, offsets[i], offsets[i + 1]):
+                seg_ordinals.append(ordinal)
+                seg_starts.append(start)
+                seg_ends.append(end)
+                seg_cum.append(position)
+                position += end - start
+
+        cum.append(position)
+        day_segments.append(len(seg_starts))
+        return cum, day_segments, seg_ordinals, seg_starts, seg_ends, seg_cum
+
+    def _extend_forward(self, index: CalendarIndex, days: int) -> CalendarIndex:
+        """New snapshot with days more dates after the window"""
+        next_ordinal = index.first + len(index.cum) - 1
+        ordinals = range(next_ordinal, next_ordinal + days)
+        offsets = [index.offsets[-1]] + [
+            self._utcoffset(datetime.fromordinal(ordinal + 1)) for ordinal in ordinals
+        ]
+
+        cum, day_segments, seg_ordinals, seg_starts, seg_ends, seg_cum = self._compile_days(
+            ordinals, offsets, index.cum[-1]
+        )
+        added = len(index.seg_starts)
+
+        return CalendarIndex(
+            index.first,
+            index.cum + cum[1:],
+            index.offsets + offsets[1:],
+            index.day_segments + [i + added for i in day_segments[1:]],
+            index.seg_ordinals + seg_ordinals,
+            index.seg_starts + seg_starts,
+            index.seg_ends + seg_ends,
+            index.seg_cum + seg_cum,
+        )
+
+    def _extend_back(self, index: CalendarIndex, days: int) -> CalendarIndex:
+        """New snapshot with days more dates before the window"""
+        new_first = index.first - days
+        ordinals = range(new_first, index.first)
+        offsets = [self._utcoffset(datetime.fromordinal(o)) for o in ordinals]
+        offsets.append(index.offsets[0])
+
+        # Positions before the window are counted back from its first midnight
+        cum, day_segments, seg_ordinals, seg_starts, seg_ends, seg_cum = self._compile_days(
+            ordinals, offsets, 0
+        )
+        shift = index.cum[0] - cum[-1]
+        added = len(seg_starts)
+
+        return CalendarIndex(
+            new_first,
+            [value + shift for value in cum[:-1]] + index.cum,
+            offsets[:-1] + index.offsets,
+            day_segments[:-1] + [i + added for i in index.day_segments],
+            seg_ordinals + index.seg_ordinals,
+            seg_starts + index.seg_starts,
+            seg_ends + index.seg_ends,
+            [value + shift for value in seg_cum] + index.seg_cum,
+        )
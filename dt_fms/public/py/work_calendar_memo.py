@@ -0,0 +1,140 @@
+"""
+Bounded per-process memo of WorkCalendar instances and results.
+
+Entries are keyed by calendar fingerprint plus inputs, so calendars rebuilt in
+later requests from the same shift and holiday list hit the same entries.
+Least recently used entries are evicted once the memo is full.
+
+This module has no Frappe dependency.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from datetime import datetime
+
+from dt_fms.public.py.work_calendar import WorkCalendar
+
+DEFAULT_MAXSIZE = 4096
+MAX_SHARED_CALENDARS = 256
+
+EXPECTED_END = "expected_end"
+WORKING_SECONDS = "working_seconds"
+
+
+class CalendarMemo:
+    """
+    LRU memo for expected end times and working times, with hit-rate counters.
+    Also keeps one shared instance per distinct calendar.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self._keys_by_fingerprint: dict[str, set[tuple]] = {}
+        self._fingerprints: dict[Hashable, str] = {}
+        self._calendars: OrderedDict[tuple, WorkCalendar] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shared(self, calendar: WorkCalendar) -> WorkCalendar:
+        """
+        Return the process-wide calendar equal to this one, so its index is
+        compiled once per process instead of once per request
+        """
+        key = (calendar.fingerprint, calendar.origin)
+        with self._lock:
+            if key in self._calendars:
+                self._calendars.move_to_end(key)
+                return self._calendars[key]
+
+            self._calendars[key] = calendar
+            if len(self._calendars) > MAX_SHARED_CALENDARS:
+                self._calendars.popitem(last=False)
+            return calendar
+
+    def expected_end(self, calendar: WorkCalendar, start: datetime, tat_seconds: float) -> datetime:
+        """
+        Memoized WorkCalendar.expected_end
+        """
+        key = (calendar.fingerprint, EXPECTED_END, start, tat_seconds)
+        return self._get(key, lambda: calendar.expected_end(start, tat_seconds))
+
+    def working_seconds(self, calendar: WorkCalendar, start: datetime, end: datetime) -> float:
+        """
+        Memoized WorkCalendar.working_seconds
+        """
+        key = (calendar.fingerprint, WORKING_SECONDS, start, end)
+        return self._get(key, lambda: calendar.working_seconds(start, end))
+
+    def register(self, calendar_key: Hashable, fingerprint: str) -> None:
+        """
+        Record the current fingerprint of a calendar key.
+        Entries of the previous fingerprint are dropped when it changes.
+        """
+        with self._lock:
+            previous = self._fingerprints.get(calendar_key)
+            self._fingerprints[calendar_key] = fingerprint
+
+        if previous is not None and previous != fingerprint:
+            self.invalidate(previous)
+
+    def invalidate(self, fingerprint: str | None = None) -> None:
+        """
+        Drop the entries of one fingerprint, or everything
+        """
+        with self._lock:
+            if fingerprint is None:
+                self._entries.clear()
+                self._keys_by_fingerprint.clear()
+                self._fingerprints.clear()
+                self._calendars.clear()
+                return
+
+            for key in self._keys_by_fingerprint.pop(fingerprint, ()):
+                self._entries.pop(key, None)
+            for key in [key for key in self._calendars if key[0] == fingerprint]:
+                del self._calendars[key]
+
+    def stats(self) -> dict[str, float]:
+        """
+        Hit and miss counters, hit rate and current size
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def _get(self, key: tuple, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._keys_by_fingerprint.setdefault(key[0], set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                keys = self._keys_by_fingerprint.get(evicted[0])
+                if keys is not None:
+                    keys.discard(evicted)
+                    if not keys:
+                        del self._keys_by_fingerprint[evicted[0]]
+
+        return value
+
+
+# Shared by every caller in this process
+calendar_memo = CalendarMemo()
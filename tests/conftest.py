@@ -0,0 +1,15 @@
+# Copyright (c) 2025, DT and Contributors
+# See license.txt
+
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+	"""Skip benchmarks unless they are asked for with --benchmark-only"""
+	if config.getoption("benchmark_only", False):
+		return
+
+	skip = pytest.mark.skip(reason="benchmark; run with --benchmark-only")
+	for item in items:
+		if "benchmark" in getattr(item, "fixturenames", ()):
+			item.add_marker(skip)
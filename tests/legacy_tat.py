@@ -0,0 +1,95 @@
+"""
+Frozen copies of the day-by-day TAT implementations that WorkCalendar replaced,
+with the Frappe lookups replaced by arguments. Used as reference oracles only.
+"""
+
+from datetime import datetime, time, timedelta
+
+import pytz
+
+
+def calculate_expected_end_time(start_time, tat_seconds, work_start, work_end, holidays):
+	"""todo_assignment.calculate_expected_end_time"""
+	current_time = start_time
+	remaining_seconds = tat_seconds
+
+	while remaining_seconds > 0:
+		if holidays and current_time.date() in holidays:
+			current_time = datetime.combine(current_time.date() + timedelta(days=1), work_start)
+			continue
+
+		day_start = datetime.combine(current_time.date(), work_start)
+		day_end = datetime.combine(current_time.date(), work_end)
+
+		if current_time < day_start:
+			current_time = day_start
+		elif current_time >= day_end:
+			current_time = datetime.combine(current_time.date() + timedelta(days=1), work_start)
+			continue
+
+		remaining_today = (day_end - current_time).total_seconds()
+
+		if remaining_seconds <= remaining_today:
+			return current_time + timedelta(seconds=remaining_seconds)
+
+		remaining_seconds -= remaining_today
+		current_time = datetime.combine(current_time.date() + timedelta(days=1), work_start)
+
+	return current_time
+
+
+def calculate_actual_working_time(start_time, end_time, work_start, work_end, holidays):
+	"""todo_assignment.calculate_actual_working_time"""
+	if end_time <= start_time:
+		return 0.0
+
+	total_seconds = 0.0
+	current_day = start_time.date()
+
+	while current_day <= end_time.date():
+		if holidays and current_day in holidays:
+			current_day += timedelta(days=1)
+			continue
+
+		day_start = datetime.combine(current_day, work_start)
+		day_end = datetime.combine(current_day, work_end)
+
+		period_start = max(start_time, day_start)
+		period_end = min(end_time, day_end)
+
+		if period_start < period_end:
+			total_seconds += (period_end - period_start).total_seconds()
+
+		current_day += timedelta(days=1)
+
+	return total_seconds
+
+
+def get_tat(start, end, timezone, shift_start_time=time(0, 0, 0), shift_end_time=time(23, 59, 59), holidays=()):
+	"""get_tat from manual_todo_assignment / delegation_sheet"""
+	system_tz = pytz.timezone(timezone)
+	holidays = set(holidays)
+
+	expected_start = start if start.tzinfo else system_tz.localize(start)
+	expected_end = end if end.tzinfo else system_tz.localize(end)
+
+	if expected_start >= expected_end:
+		return 0
+
+	total_seconds = 0
+	current_dt = expected_start
+
+	while current_dt < expected_end:
+		if current_dt.date() not in holidays:
+			shift_start_dt = system_tz.localize(datetime.combine(current_dt.date(), shift_start_time))
+			shift_end_dt = system_tz.localize(datetime.combine(current_dt.date(), shift_end_time))
+
+			day_start = max(expected_start, shift_start_dt)
+			day_end = min(expected_end, shift_end_dt)
+
+			if day_start < day_end:
+				total_seconds += (day_end - day_start).total_seconds()
+
+		current_dt += timedelta(days=1)
+
+	return int(total_seconds)
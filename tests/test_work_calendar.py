@@ -0,0 +1,365 @@
+# Copyright (c) 2025, DT and Contributors
+# See license.txt
+
+import random
+import unittest
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import legacy_tat
+
+from dt_fms.public.py.work_calendar import HolidaySet, WorkCalendar, to_time
+from dt_fms.public.py.work_calendar_memo import CalendarMemo
+
+SEED = 20250601
+CASES = 500
+
+
+def random_holidays(rnd, year=2025, count=40):
+	return {date(year, 1, 1) + timedelta(days=rnd.randrange(540)) for _ in range(count)}
+
+
+def random_datetime(rnd, year=2025, days=365):
+	return datetime(year, 1, 1) + timedelta(seconds=rnd.randrange(days * 86400))
+
+
+def random_hours(rnd):
+	start = time(rnd.randrange(0, 12), rnd.choice((0, 15, 30, 45)))
+	end = time(rnd.randrange(13, 24), rnd.choice((0, 15, 30, 45)))
+	return start, end
+
+
+class TestToTime(unittest.TestCase):
+	def test_coerces_time_field_values(self):
+		self.assertEqual(to_time(time(9, 30)), time(9, 30))
+		self.assertEqual(to_time(timedelta(hours=18, minutes=5, seconds=7)), time(18, 5, 7))
+		self.assertEqual(to_time("09:15:00"), time(9, 15))
+		self.assertEqual(to_time("9:15"), time(9, 15))
+		self.assertIsNone(to_time(None))
+		self.assertIsNone(to_time("garbage"))
+
+
+class TestWorkCalendar(unittest.TestCase):
+	def test_rejects_empty_working_window(self):
+		with self.assertRaises(ValueError):
+			WorkCalendar(time(9), time(9))
+		with self.assertRaises(ValueError):
+			WorkCalendar(intervals={5: []})
+
+	def test_expected_end_skips_holidays_and_nights(self):
+		# Friday 17:00, Saturday is a holiday
+		calendar = WorkCalendar(time(9), time(18), {date(2025, 6, 7)})
+		self.assertEqual(
+			calendar.expected_end(datetime(2025, 6, 6, 17, 0), 2 * 3600),
+			datetime(2025, 6, 8, 10, 0),
+		)
+
+	def test_expected_end_on_day_boundary_stays_on_same_day(self):
+		calendar = WorkCalendar(time(9), time(18))
+		self.assertEqual(
+			calendar.expected_end(datetime(2025, 6, 6, 9, 0), 9 * 3600),
+			datetime(2025, 6, 6, 18, 0),
+		)
+
+	def test_positions_are_stable_when_window_grows_backwards(self):
+		calendar = WorkCalendar(time(9), time(18), origin=date(2025, 6, 1))
+		position = calendar.position(datetime(2025, 6, 2, 10, 0))
+		calendar.position(datetime(2024, 1, 1, 10, 0))
+		self.assertEqual(calendar.position(datetime(2025, 6, 2, 10, 0)), position)
+		self.assertEqual(position, 9 * 3600 + 3600)
+
+	def test_round_trip(self):
+		rnd = random.Random(SEED)
+		for _ in range(CASES):
+			calendar = WorkCalendar(*random_hours(rnd), random_holidays(rnd))
+			start = random_datetime(rnd)
+			tat = rnd.randrange(1, 60 * 86400)
+			end = calendar.expected_end(start, tat)
+			self.assertAlmostEqual(calendar.working_seconds(start, end), tat, places=6)
+
+
+def random_intervals(rnd):
+	"""Random working week with breaks, split shifts and overnight shifts"""
+	week = {}
+	for weekday in range(7):
+		if rnd.random() < 0.2:
+			continue
+		week[weekday] = [
+			(time(rnd.randrange(24), rnd.choice((0, 30))), time(rnd.randrange(24), rnd.choice((0, 30))))
+			for _ in range(rnd.randrange(1, 4))
+		]
+	week.setdefault(0, [(time(9), time(17))])
+	return {weekday: [(s, e) for s, e in pairs if s != e] or [(time(9), time(17))] for weekday, pairs in week.items()}
+
+
+def brute_force_working_minutes(intervals, holidays, start, end):
+	"""Count working minutes by checking every minute against the shift it falls in"""
+	minutes = 0
+	current = start
+	while current < end:
+		for offset in (0, 1):
+			shift_date = current.date() - timedelta(days=offset)
+			if shift_date in holidays:
+				continue
+			for shift_start, shift_end in intervals.get(shift_date.weekday(), ()):
+				window_start = datetime.combine(shift_date, shift_start)
+				window_end = datetime.combine(shift_date, shift_end)
+				if shift_end <= shift_start:
+					window_end += timedelta(days=1)
+				if window_start <= current < window_end:
+					break
+			else:
+				continue
+			minutes += 1
+			break
+		current += timedelta(minutes=1)
+	return minutes
+
+
+class TestHolidaySet(unittest.TestCase):
+	def setUp(self):
+		# Every Sunday and second Saturday of 2025, a few festivals, one working Sunday
+		days = [date(2025, 1, 1) + timedelta(days=i) for i in range(365)]
+		self.dates = {d for d in days if d.weekday() == 6 or (d.weekday() == 5 and 8 <= d.day <= 14)}
+		self.dates |= {date(2025, 1, 26), date(2025, 8, 15), date(2025, 10, 2)}
+		self.dates.discard(date(2025, 3, 16))
+		self.holidays = HolidaySet.from_dates(self.dates, date(2025, 1, 1), date(2025, 12, 31))
+
+	def test_detects_weekly_offs(self):
+		self.assertEqual(self.holidays.weekly_mask, 1 << 6)
+		self.assertEqual(self.holidays.workdays, {date(2025, 3, 16).toordinal()})
+		self.assertEqual(len(self.holidays.extra), 12 + 2)
+
+	def test_membership_matches_dates(self):
+		for i in range(-30, 400):
+			day = date(2025, 1, 1) + timedelta(days=i)
+			self.assertEqual(day in self.holidays, day in self.dates, day)
+
+	def test_round_trips(self):
+		self.assertEqual(set(self.holidays), self.dates)
+		self.assertEqual(len(self.holidays), len(self.dates))
+		self.assertEqual(HolidaySet.from_dict(self.holidays.to_dict()), self.holidays)
+
+	def test_calendar_accepts_either_form(self):
+		compact = WorkCalendar(time(9), time(18), self.holidays)
+		plain = WorkCalendar(time(9), time(18), self.dates)
+		start = datetime(2025, 3, 14, 15)
+		self.assertEqual(compact.expected_end(start, 40 * 3600), plain.expected_end(start, 40 * 3600))
+
+
+class TestIntervals(unittest.TestCase):
+	def test_lunch_break_is_not_working_time(self):
+		calendar = WorkCalendar(intervals={d: [(time(9), time(13)), (time(14), time(18))] for d in range(7)})
+
+		self.assertEqual(
+			calendar.working_seconds(datetime(2025, 6, 2, 12), datetime(2025, 6, 2, 15)), 2 * 3600
+		)
+		self.assertEqual(calendar.expected_end(datetime(2025, 6, 2, 12), 3600), datetime(2025, 6, 2, 13))
+		self.assertEqual(calendar.expected_end(datetime(2025, 6, 2, 12), 3601), datetime(2025, 6, 2, 14, 0, 1))
+
+	def test_overnight_shift_belongs_to_its_start_date(self):
+		# Monday 2025-06-02 is a holiday: its 22:00-06:00 shift is off, Sunday's spill is not
+		calendar = WorkCalendar(time(22), time(6), {date(2025, 6, 2)})
+
+		self.assertEqual(
+			calendar.working_seconds(datetime(2025, 6, 1, 21), datetime(2025, 6, 3, 7)), 8 * 3600
+		)
+		self.assertEqual(calendar.expected_end(datetime(2025, 6, 2, 5), 2 * 3600), datetime(2025, 6, 3, 23))
+
+	def test_weekdays_without_intervals_are_off(self):
+		calendar = WorkCalendar(intervals={d: [(time(9), time(17))] for d in range(5)})
+		# Friday 16:00 plus two hours lands on Monday 10:00
+		self.assertEqual(calendar.expected_end(datetime(2025, 6, 6, 16), 2 * 3600), datetime(2025, 6, 9, 10))
+
+	def test_matches_brute_force(self):
+		rnd = random.Random(SEED)
+		for _ in range(CASES // 10):
+			intervals = random_intervals(rnd)
+			holidays = random_holidays(rnd, count=80)
+			calendar = WorkCalendar(intervals=intervals, holidays=holidays)
+
+			start = random_datetime(rnd).replace(second=0)
+			end = start + timedelta(minutes=rnd.randrange(0, 6 * 24 * 60))
+			self.assertEqual(
+				calendar.working_seconds(start, end),
+				60 * brute_force_working_minutes(intervals, holidays, start, end),
+			)
+
+	def test_round_trip(self):
+		rnd = random.Random(SEED)
+		tz = ZoneInfo("Europe/London")
+		calendars = [
+			WorkCalendar(intervals=random_intervals(rnd), holidays=random_holidays(rnd), tz=tz)
+			for _ in range(3)
+		]
+
+		for _ in range(CASES):
+			calendar = rnd.choice(calendars)
+			start = random_datetime(rnd)
+			tat = rnd.randrange(1, 30 * 86400)
+
+			expected = calendar.expected_end(start, tat)
+			self.assertAlmostEqual(calendar.working_seconds(start, expected), tat, places=6)
+
+
+class TestLegacyEquivalence(unittest.TestCase):
+	"""WorkCalendar against the day-by-day implementations it replaced"""
+
+	def test_expected_end_time(self):
+		rnd = random.Random(SEED)
+		for _ in range(CASES):
+			work_start, work_end = random_hours(rnd)
+			holidays = random_holidays(rnd)
+			start = random_datetime(rnd)
+			tat = rnd.randrange(1, 60 * 86400)
+
+			calendar = WorkCalendar(work_start, work_end, holidays)
+			self.assertEqual(
+				calendar.expected_end(start, tat),
+				legacy_tat.calculate_expected_end_time(start, tat, work_start, work_end, holidays),
+			)
+
+	def test_actual_working_time(self):
+		rnd = random.Random(SEED)
+		for _ in range(CASES):
+			work_start, work_end = random_hours(rnd)
+			holidays = random_holidays(rnd)
+			start = random_datetime(rnd)
+			end = start + timedelta(seconds=rnd.randrange(-86400, 90 * 86400))
+
+			calendar = WorkCalendar(work_start, work_end, holidays)
+			self.assertAlmostEqual(
+				calendar.working_seconds(start, end),
+				legacy_tat.calculate_actual_working_time(start, end, work_start, work_end, holidays),
+				places=6,
+			)
+
+	def test_get_tat(self):
+		# The legacy loop steps whole days from the start time, so it only visits
+		# the end date when the end clock time is after the start clock time.
+		rnd = random.Random(SEED)
+		for _ in range(CASES):
+			work_start, work_end = random_hours(rnd)
+			holidays = random_holidays(rnd)
+			start = random_datetime(rnd)
+			end = start + timedelta(seconds=rnd.randrange(0, 90 * 86400))
+			if end.time() <= start.time():
+				continue
+
+			calendar = WorkCalendar(work_start, work_end, holidays)
+			self.assertEqual(
+				int(calendar.working_seconds(start, end)),
+				legacy_tat.get_tat(start, end, "Asia/Kolkata", work_start, work_end, holidays),
+			)
+
+
+class TestTimezone(unittest.TestCase):
+	def test_dst_transition_days_count_real_seconds(self):
+		calendar = WorkCalendar(time(0, 0), time(23, 59, 59), tz=ZoneInfo("Europe/London"))
+
+		spring = datetime(2025, 3, 30)
+		autumn = datetime(2025, 10, 26)
+		self.assertEqual(calendar.working_seconds(spring, spring + timedelta(days=1)), 23 * 3600 - 1)
+		self.assertEqual(calendar.working_seconds(autumn, autumn + timedelta(days=1)), 25 * 3600 - 1)
+
+	def test_aware_and_naive_values_agree(self):
+		tz = ZoneInfo("America/New_York")
+		rnd = random.Random(SEED)
+		calendar = WorkCalendar(time(9), time(18), random_holidays(rnd), tz=tz)
+
+		for _ in range(CASES):
+			start = random_datetime(rnd)
+			tat = rnd.randrange(1, 30 * 86400)
+			expected = calendar.expected_end(start, tat)
+
+			aware_start = start.replace(tzinfo=tz).astimezone(ZoneInfo("UTC"))
+			aware_expected = calendar.expected_end(aware_start, tat)
+			self.assertEqual(aware_expected.astimezone(tz).replace(tzinfo=None), expected)
+			self.assertAlmostEqual(calendar.working_seconds(start, expected), tat, places=6)
+
+	def test_get_tat_outside_dst_transitions(self):
+		# The legacy loop keeps the start offset while stepping days, so spans
+		# crossing a DST change are off by an hour there; compare the rest.
+		rnd = random.Random(SEED)
+		for zone in ("Europe/London", "America/New_York", "Australia/Sydney"):
+			tz = ZoneInfo(zone)
+			for _ in range(CASES // 5):
+				work_start, work_end = random_hours(rnd)
+				holidays = random_holidays(rnd)
+				start = random_datetime(rnd)
+				end = start + timedelta(seconds=rnd.randrange(0, 60 * 86400))
+				if end.time() <= start.time():
+					continue
+				if start.replace(tzinfo=tz).utcoffset() != end.replace(tzinfo=tz).utcoffset():
+					continue
+
+				calendar = WorkCalendar(work_start, work_end, holidays, tz=tz)
+				self.assertEqual(
+					int(calendar.working_seconds(start, end)),
+					legacy_tat.get_tat(start, end, zone, work_start, work_end, holidays),
+				)
+
+
+class TestCalendarMemo(unittest.TestCase):
+	def test_fingerprint_tracks_calendar_inputs(self):
+		holidays = {date(2025, 6, 2)}
+		calendar = WorkCalendar(time(9), time(18), holidays)
+
+		self.assertEqual(calendar.fingerprint, WorkCalendar("09:00", "18:00", holidays).fingerprint)
+		self.assertNotEqual(calendar.fingerprint, WorkCalendar(time(9), time(18)).fingerprint)
+		self.assertNotEqual(
+			calendar.fingerprint,
+			WorkCalendar(time(9), time(18), holidays, tz=ZoneInfo("Asia/Kolkata")).fingerprint,
+		)
+
+	def test_hits_are_shared_across_equal_calendars(self):
+		memo = CalendarMemo()
+		start = datetime(2025, 6, 2, 10)
+
+		first = memo.expected_end(WorkCalendar(time(9), time(18)), start, 3600 * 12)
+		second = memo.expected_end(WorkCalendar(time(9), time(18)), start, 3600 * 12)
+
+		self.assertEqual(first, datetime(2025, 6, 3, 13))
+		self.assertEqual(second, first)
+		self.assertEqual(memo.stats()["hits"], 1)
+		self.assertEqual(memo.stats()["misses"], 1)
+		self.assertEqual(memo.stats()["hit_rate"], 0.5)
+
+	def test_evicts_least_recently_used(self):
+		memo = CalendarMemo(maxsize=2)
+		calendar = WorkCalendar(time(9), time(18))
+		start = datetime(2025, 6, 2, 10)
+
+		memo.working_seconds(calendar, start, datetime(2025, 6, 2, 11))
+		memo.working_seconds(calendar, start, datetime(2025, 6, 2, 12))
+		memo.working_seconds(calendar, start, datetime(2025, 6, 2, 11))
+		memo.working_seconds(calendar, start, datetime(2025, 6, 2, 13))
+
+		self.assertEqual(memo.stats()["size"], 2)
+		memo.working_seconds(calendar, start, datetime(2025, 6, 2, 11))
+		self.assertEqual(memo.stats()["hits"], 2)
+
+	def test_equal_calendars_share_one_instance(self):
+		memo = CalendarMemo()
+		origin = date(2020, 1, 1)
+		calendar = memo.shared(WorkCalendar(time(9), time(18), origin=origin))
+
+		self.assertIs(memo.shared(WorkCalendar("09:00", "18:00", origin=origin)), calendar)
+		self.assertIsNot(memo.shared(WorkCalendar(time(9), time(18))), calendar)
+
+		memo.invalidate(calendar.fingerprint)
+		self.assertIsNot(memo.shared(WorkCalendar(time(9), time(18), origin=origin)), calendar)
+
+	def test_changed_fingerprint_drops_old_entries(self):
+		memo = CalendarMemo()
+		calendar = WorkCalendar(time(9), time(18))
+		memo.register("shift", calendar.fingerprint)
+		memo.working_seconds(calendar, datetime(2025, 6, 2, 10), datetime(2025, 6, 3, 10))
+
+		updated = WorkCalendar(time(9), time(18), {date(2025, 6, 3)})
+		memo.register("shift", updated.fingerprint)
+
+		self.assertEqual(memo.stats()["size"], 0)
+		self.assertEqual(
+			memo.working_seconds(updated, datetime(2025, 6, 2, 10), datetime(2025, 6, 3, 10)), 8 * 3600
+		)
@@ -0,0 +1,74 @@
+# Copyright (c) 2025, DT and Contributors
+# See license.txt
+
+"""
+TAT benchmarks for 1, 30 and 365 day spans on sparse and dense holiday lists.
+Skipped by default; run them with
+
+	pytest tests/test_work_calendar_benchmark.py --benchmark-only --benchmark-group-by=param:span
+"""
+
+from datetime import date, datetime, time, timedelta
+
+import legacy_tat
+import pytest
+
+from dt_fms.public.py.work_calendar import WorkCalendar
+
+pytest.importorskip("pytest_benchmark")
+
+WORK_START = time(9, 30)
+WORK_END = time(18, 30)
+START = datetime(2025, 1, 6, 11, 0)
+SPANS = {"1d": 1, "30d": 30, "365d": 365}
+
+
+def holiday_list(kind):
+	days = [date(2025, 1, 1) + timedelta(days=i) for i in range(800)]
+	if kind == "dense":
+		# Every weekend plus a festival every other week
+		return {d for d in days if d.weekday() >= 5 or d.toordinal() % 14 == 0}
+	return {d for d in days if d.toordinal() % 37 == 0}
+
+
+@pytest.fixture(params=["sparse", "dense"])
+def holidays(request):
+	return holiday_list(request.param)
+
+
+@pytest.fixture(params=list(SPANS))
+def span(request):
+	return SPANS[request.param]
+
+
+def test_expected_end(benchmark, holidays, span):
+	calendar = WorkCalendar(WORK_START, WORK_END, holidays)
+	tat = span * 9 * 3600
+	benchmark(calendar.expected_end, START, tat)
+
+
+def test_expected_end_legacy(benchmark, holidays, span):
+	tat = span * 9 * 3600
+	benchmark(legacy_tat.calculate_expected_end_time, START, tat, WORK_START, WORK_END, holidays)
+
+
+def test_working_seconds(benchmark, holidays, span):
+	calendar = WorkCalendar(WORK_START, WORK_END, holidays)
+	end = START + timedelta(days=span)
+	benchmark(calendar.working_seconds, START, end)
+
+
+def test_working_seconds_legacy(benchmark, holidays, span):
+	end = START + timedelta(days=span)
+	benchmark(legacy_tat.calculate_actual_working_time, START, end, WORK_START, WORK_END, holidays)
+
+
+def test_get_tat_legacy(benchmark, holidays, span):
+	end = START + timedelta(days=span, hours=1)
+	benchmark(legacy_tat.get_tat, START, end, "Asia/Kolkata", WORK_START, WORK_END, holidays)
+
+
+def test_cold_calendar(benchmark, holidays, span):
+	"""Building the index is part of the cost the first time a calendar is used"""
+	end = START + timedelta(days=span)
+	benchmark(lambda: WorkCalendar(WORK_START, WORK_END, holidays).working_seconds(START, end))